@@ -11,11 +11,37 @@ bl_info = {
     "category": "Development",
 }
 
+import time
+_import_start = time.perf_counter()
+
 import bpy 
 
+from . import lazy, redraw
+from .discovery import find_debugpy, start_debugpy_discovery, stop_debugpy_discovery, DEBUGPY_NOT_FOUND
+from .lazy import Subsystem, startup_step, startup_report, startup_times
 from .utils import make_annotations
-from .watcher import register_watcher, unregister_watcher
-from .debugger import register_debugger, unregister_debugger, check_for_debugpy
+
+
+# The watcher and the debugger are only imported once used, see lazy.py.
+Subsystem(
+    'watcher', '.watcher', 'register_watcher', 'unregister_watcher',
+    panel=('SCENE_PT_script_watcher', 'Script Watcher'),
+    operators=(
+        ('wm.sw_watch_start', 'Watch Script'),
+        ('wm.sw_edit_externally', 'Edit Externally'),
+    ),
+    scene_flag=('sw_settings', 'auto_watch_on_startup'),
+    load_post='load_handler',
+)
+
+Subsystem(
+    'debugger', '.debugger', 'register_debugger', 'unregister_debugger',
+    panel=('DVC_PT_DebuggerPanel', 'Debugger for VSCode'),
+    operators=(
+        ('debug.connect_debugger_vscode', 'Debug: Start Debug Server for VS Code',
+         {'waitForClient': bpy.props.BoolProperty(default=False)}),
+    ),
+)
 
 
 @make_annotations
@@ -31,7 +57,7 @@ class AddonPreferences(bpy.types.AddonPreferences):
     path = bpy.props.StringProperty(
       name="Location of debugpy (site-packages folder)",
       subtype="DIR_PATH",
-      default=check_for_debugpy()
+      default=find_debugpy() or DEBUGPY_NOT_FOUND
     )
 
     timeout = bpy.props.IntProperty(
@@ -46,6 +72,43 @@ class AddonPreferences(bpy.types.AddonPreferences):
       default=5678
     )
 
+    port_mode = bpy.props.EnumProperty(
+      name="Port Mode",
+      items=(
+        ('FIXED', "Fixed", "Always listen on the port above"),
+        ('AUTO', "Automatic", "Listen on the first port of the range no other Blender instance on this host uses"),
+      ),
+      default='FIXED'
+    )
+
+    port_range_start = bpy.props.IntProperty(
+      name="First Port",
+      min=1,
+      max=65535,
+      default=5678
+    )
+
+    port_range_end = bpy.props.IntProperty(
+      name="Last Port",
+      min=1,
+      max=65535,
+      default=5777
+    )
+
+    trace_scope = bpy.props.EnumProperty(
+      name="Trace",
+      items=(
+        ('ALL', "All Code", "The debugger traces all the Python code Blender runs"),
+        ('WATCHED', "Watched Scripts", "The debugger only traces the watched scripts while the watcher runs them and their operators, everything else runs at full speed. Breakpoints in their panels, timers and handlers are not hit"),
+      ),
+      default='ALL'
+    )
+
+    launch_json = bpy.props.StringProperty(
+      name="launch.json",
+      description="VS Code launch.json to keep an attach configuration per running Blender instance in, none if empty",
+      subtype='FILE_PATH'
+    )
 
     def draw(self, context):
         layout = self.layout
@@ -61,20 +124,44 @@ class AddonPreferences(bpy.types.AddonPreferences):
         row_timeout.label(text="Timeout in seconds for the attach confirmation listener.")
 
         row_port = layout.split()
-        row_port.prop(self, "port")
-        row_port.label(text="Port to use. Should match port in VS Code's launch.json.")
+        row_port.prop(self, "port_mode")
+        if self.port_mode == 'FIXED':
+            row_port.prop(self, "port")
+            row_port.label(text="Port to use. Should match port in VS Code's launch.json.")
+        else:
+            row_port.prop(self, "port_range_start")
+            row_port.prop(self, "port_range_end")
+
+        layout.prop(self, "trace_scope")
+        layout.prop(self, "launch_json")
+
+        box = layout.box()
+        box.label(text="Startup times", icon='TIME')
+        for step, seconds in startup_times.items():
+            box.label(text="%s: %.1f ms" % (step, seconds * 1000))
+
 
+startup_times['import'] = time.perf_counter() - _import_start
 
 
 def register():
-    bpy.utils.register_class(AddonPreferences)
-    register_watcher()
-    register_debugger()
+    # Only the import happens once, the other steps are timed again.
+    for step in list(startup_times)[1:]:
+        del startup_times[step]
+
+    with startup_step('preferences'):
+        bpy.utils.register_class(AddonPreferences)
+        redraw.register()
+    lazy.register()
+    with startup_step('debugpy discovery'):
+        start_debugpy_discovery()
+    print('Code Tools startup: %s' % startup_report())
 
 def unregister():
     bpy.utils.unregister_class(AddonPreferences)
-    unregister_watcher()
-    unregister_debugger()
+    lazy.unregister()
+    redraw.unregister()
+    stop_debugpy_discovery()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,371 @@
+"""
+Minimal stand-in for Blender's bpy module, enough to run the addon in plain CPython.
+
+Properties become plain attributes with their default value, registered
+operators can be called through bpy.ops, every other operator call is only
+recorded, and timers run when the benchmark calls bpy.app.timers.pump().
+"""
+
+import contextlib
+import os
+import sys
+import time
+import types as _types
+
+
+# bpy.props
+
+class _Property:
+    def __init__(self, function, keywords):
+        self.function = function
+        self.keywords = keywords
+
+    def default(self):
+        if self.function == 'PointerProperty':
+            return _instance(self.keywords['type'])
+        if self.function == 'CollectionProperty':
+            return _Collection(self.keywords['type'])
+        if 'default' in self.keywords:
+            return self.keywords['default']
+        if self.function == 'EnumProperty':
+            return self.keywords['items'][0][0]
+        return {'BoolProperty': False, 'IntProperty': 0, 'FloatProperty': 0.0, 'StringProperty': ''}[self.function]
+
+
+def _property_function(name):
+    def function(**keywords):
+        return _Property(name, keywords)
+    function.__name__ = name
+    return function
+
+
+props = _types.ModuleType('bpy.props')
+for _name in ('BoolProperty', 'IntProperty', 'FloatProperty', 'StringProperty',
+              'EnumProperty', 'PointerProperty', 'CollectionProperty'):
+    setattr(props, _name, _property_function(_name))
+
+
+def _properties(cls):
+    """Return {name: _Property} of a class, whether they are annotations or not."""
+    found = {}
+    for base in reversed(cls.__mro__):
+        for name, value in list(base.__dict__.get('__annotations__', {}).items()) + list(base.__dict__.items()):
+            if isinstance(value, _Property):
+                found[name] = value
+    return found
+
+
+def _instance(cls):
+    obj = cls.__new__(cls)
+    for name, prop in _properties(cls).items():
+        object.__setattr__(obj, name, prop.default())
+    return obj
+
+
+class _Collection(list):
+    def __init__(self, type):
+        list.__init__(self)
+        self.type = type
+
+    def add(self):
+        item = _instance(self.type)
+        self.append(item)
+        return item
+
+    def remove(self, index):
+        del self[index]
+
+
+# bpy.types
+
+class _StructMeta(type):
+    """Properties can be added to registered types, like bpy.types.Scene.sw_settings."""
+
+    def __setattr__(cls, name, value):
+        if isinstance(value, _Property):
+            if '__annotations__' not in cls.__dict__:
+                type.__setattr__(cls, '__annotations__', {})
+            cls.__dict__['__annotations__'][name] = value
+        else:
+            type.__setattr__(cls, name, value)
+
+    def __delattr__(cls, name):
+        annotations = cls.__dict__.get('__annotations__', {})
+        if name in annotations:
+            del annotations[name]
+        else:
+            type.__delattr__(cls, name)
+
+
+class _Struct(metaclass=_StructMeta):
+    def __getattr__(self, name):
+        prop = _properties(type(self)).get(name)
+        if prop is None:
+            raise AttributeError(name)
+        value = prop.default()
+        object.__setattr__(self, name, value)
+        return value
+
+    def as_pointer(self):
+        return id(self)
+
+    def get(self, key, default=None):
+        """ID properties: the property groups that were set, as dicts."""
+        value = self.__dict__.get(key, default)
+        return vars(value) if isinstance(value, _Struct) else value
+
+
+types = _types.ModuleType('bpy.types')
+types.bpy_struct = _Struct
+for _name in ('Operator', 'Panel', 'PropertyGroup', 'AddonPreferences', 'UIList', 'Menu', 'Header', 'WindowManager'):
+    setattr(types, _name, type(_name, (_Struct,), {'__module__': 'bpy.types'}))
+
+
+class Scene(_Struct):
+    def __init__(self, name='Scene'):
+        self.name = name
+
+
+types.Scene = Scene
+
+
+# bpy.ops
+
+class _OperatorCaller:
+    """Call a registered operator, without invoking it unless it only has invoke."""
+
+    def __init__(self, cls):
+        self.cls = cls
+
+    def __call__(self, *args, **kwargs):
+        op = _instance(self.cls)
+        for name, value in kwargs.items():
+            setattr(op, name, value)
+        op.report = lambda level, message: None
+        if hasattr(op, 'poll') and not op.poll(context):
+            raise RuntimeError('Operator %s.poll() failed' % self.cls.bl_idname)
+        if hasattr(op, 'execute'):
+            return op.execute(context)
+        return op.invoke(context, None)
+
+
+class _OperatorModule:
+    """bpy.ops.<module>: registered operators, or recorders for Blender's own."""
+
+    def __init__(self, name):
+        self._name = name
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def record(*args, **kwargs):
+            self.calls.append((name, kwargs))
+            return {'FINISHED'}
+        return record
+
+
+class _Operators:
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        module = _OperatorModule(name)
+        setattr(self, name, module)
+        return module
+
+
+ops = _Operators()
+
+
+# bpy.utils
+
+utils = _types.ModuleType('bpy.utils')
+_registered = {}
+
+
+def _register_class(cls):
+    if _registered.get(cls.__name__) is cls:
+        raise ValueError('register_class(...): already registered as a subclass \'%s\'' % cls.__name__)
+    _registered[cls.__name__] = cls
+    if issubclass(cls, types.Operator):
+        module, _, name = cls.bl_idname.partition('.')
+        setattr(getattr(ops, module), name, _OperatorCaller(cls))
+    elif issubclass(cls, types.AddonPreferences):
+        context.preferences.addons[cls.bl_idname].preferences = _instance(cls)
+
+
+def _unregister_class(cls):
+    _registered.pop(cls.__name__, None)
+    if issubclass(cls, types.Operator):
+        module, _, name = cls.bl_idname.partition('.')
+        getattr(ops, module).__dict__.pop(name, None)
+
+
+def _user_resource(kind, path='', create=False):
+    directory = os.path.join(os.environ.get('FAKEBPY_HOME', os.path.join(app.tempdir, 'fakebpy')), kind.lower(), path)
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+utils.register_class = _register_class
+utils.unregister_class = _unregister_class
+utils.user_resource = _user_resource
+
+
+# bpy.app
+
+app = _types.ModuleType('bpy.app')
+app.version = (4, 0, 0)
+app.background = True
+app.tempdir = os.environ.get('TMPDIR', '/tmp')
+app.binary_path = sys.executable
+
+app.handlers = _types.ModuleType('bpy.app.handlers')
+app.handlers.load_post = []
+app.handlers.depsgraph_update_post = []
+app.handlers.persistent = lambda function: function
+
+app.timers = _types.ModuleType('bpy.app.timers')
+_timers = {}  # Function -> time.monotonic() it is due.
+
+
+def _timers_register(function, first_interval=0, persistent=False):
+    _timers[function] = time.monotonic() + first_interval
+
+
+def _timers_unregister(function):
+    if function not in _timers:
+        raise ValueError('Error: function is not registered')
+    del _timers[function]
+
+
+def _timers_pump():
+    """Run the due timers once, return the seconds until the next one is due."""
+    now = time.monotonic()
+    for function, due in list(_timers.items()):
+        if due <= now and function in _timers:
+            interval = function()
+            if function not in _timers:
+                continue
+            if interval is None:
+                del _timers[function]
+            else:
+                _timers[function] = time.monotonic() + interval
+    return min([due - time.monotonic() for due in _timers.values()] or [0.1])
+
+
+app.timers.register = _timers_register
+app.timers.unregister = _timers_unregister
+app.timers.is_registered = lambda function: function in _timers
+app.timers.pump = _timers_pump
+
+
+# bpy.path
+
+path = _types.ModuleType('bpy.path')
+path.abspath = lambda filepath: os.path.abspath(filepath) if filepath else filepath
+
+
+# bpy.context and bpy.data
+
+class _Region:
+    def __init__(self, type):
+        self.type = type
+        self.redraws = 0
+
+    def tag_redraw(self):
+        self.redraws += 1
+
+
+class _Area:
+    def __init__(self, type):
+        self.type = type
+        self.regions = [_Region('WINDOW'), _Region('UI'), _Region('HEADER')]
+
+    def tag_redraw(self):
+        pass
+
+    def as_pointer(self):
+        return id(self)
+
+
+class _Screen:
+    def __init__(self):
+        self.areas = [_Area('TEXT_EDITOR'), _Area('CONSOLE'), _Area('VIEW_3D')]
+
+    def as_pointer(self):
+        return id(self)
+
+
+class _Window:
+    def __init__(self):
+        self.screen = _Screen()
+
+
+class _WindowManager:
+    def __init__(self):
+        self.windows = [_Window()]
+
+    def event_timer_add(self, time_step, window=None):
+        return object()
+
+    def event_timer_remove(self, timer):
+        pass
+
+    def modal_handler_add(self, operator):
+        pass
+
+    def fileselect_add(self, operator):
+        pass
+
+
+class _Addons(dict):
+    def __missing__(self, key):
+        addon = _types.SimpleNamespace(preferences=None)
+        self[key] = addon
+        return addon
+
+
+class _Context:
+    def __init__(self):
+        self.scene = Scene()
+        self.window_manager = _WindowManager()
+        self.window = self.window_manager.windows[0]
+        self.preferences = _types.SimpleNamespace(addons=_Addons())
+
+    @property
+    def screen(self):
+        return self.window.screen
+
+    def copy(self):
+        return {}
+
+    def temp_override(self, *args, **kwargs):
+        return contextlib.contextmanager(lambda: (yield))()
+
+
+class _IDCollection(list):
+    def get(self, name, default=None):
+        for item in self:
+            if item.name == name:
+                return item
+        return default
+
+
+class _Data:
+    filepath = ''
+
+    @property
+    def scenes(self):
+        return _IDCollection([context.scene])
+
+
+context = _Context()
+data = _Data()
+
+
+for _name, _module in (('props', props), ('types', types), ('utils', utils), ('app', app),
+                       ('app.handlers', app.handlers), ('app.timers', app.timers), ('path', path)):
+    sys.modules['bpy.' + _name] = _module
@@ -0,0 +1 @@
+"""Stand-in for Blender's console_python module, the addon only imports it."""
@@ -0,0 +1,59 @@
+"""
+Minimal stand-in for debugpy, enough to start the addon's debug server in plain CPython.
+
+Nothing listens on the port. A client attaches when the benchmark calls
+attach() and detaches when it calls detach().
+"""
+
+import threading
+
+
+listening = None  # The address passed to listen().
+
+_state = threading.Condition()
+_connected = False
+_cancelled = False
+
+
+def listen(address):
+    global listening
+    listening = address
+    return address
+
+
+def is_client_connected():
+    return _connected
+
+
+def wait_for_client():
+    global _cancelled
+    with _state:
+        _state.wait_for(lambda: _connected or _cancelled)
+        _cancelled = False
+
+
+def _cancel_wait():
+    global _cancelled
+    with _state:
+        _cancelled = True
+        _state.notify_all()
+
+
+wait_for_client.cancel = _cancel_wait
+
+
+def trace_this_thread(should_trace):
+    pass
+
+
+def attach():
+    global _connected
+    with _state:
+        _connected = True
+        _state.notify_all()
+
+
+def detach():
+    global _connected
+    with _state:
+        _connected = False
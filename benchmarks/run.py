@@ -0,0 +1,502 @@
+"""
+run.py: Benchmarks of the script watcher, in plain CPython.
+
+The addon runs against the bpy stand-in in benchmarks/fakebpy, watching
+generated packages of 10, 1000 and 10000 python files. The debugger runs
+against the debugpy stand-in in benchmarks/fakedebugpy.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --sizes 10 1000 --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+
+All the timings are in seconds and are saved in a single JSON file, with
+the same keys from one run to the next so two runs can be compared. By
+default it goes to benchmarks/results/, which git ignores.
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+ADDON = 'script_watcher_addon'  # The repository directory isn't always a valid module name.
+PACKAGE = 'bench_pkg'
+SCHEMA = 1
+
+MODULES_PER_PACKAGE = 100
+
+MODULE = '''"""Generated module."""
+
+CONSTANT = {value}
+
+
+def function(value):
+    return value * CONSTANT + 1
+
+
+class Generated:
+    def method(self, value):
+        return function(value)
+'''
+
+
+OPERATORS = '''import bpy
+
+
+class GENERATED_OT_operator(bpy.types.Operator):
+    bl_idname = 'generated.operator'
+    bl_label = 'Generated'
+
+    def execute(self, context):
+        return {'FINISHED'}
+'''
+
+REGISTER = '''
+import bpy
+from .ops import GENERATED_OT_operator
+
+
+def register():
+    bpy.utils.register_class(GENERATED_OT_operator)
+
+
+def unregister():
+    bpy.utils.unregister_class(GENERATED_OT_operator)
+
+
+register()
+'''
+
+
+def log(*args):
+    print(*args, file=sys.__stderr__, flush=True)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the output of the reloads, the watcher restores sys.__stdout__ after each one."""
+    saved = sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = sys.stderr = sys.__stdout__ = sys.__stderr__ = devnull
+        try:
+            yield
+        finally:
+            sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__ = saved
+
+
+def summary(values):
+    """Return the median, min and max of a list of timings."""
+    return {
+        'median': statistics.median(values),
+        'min': min(values),
+        'max': max(values),
+    }
+
+
+def per_call(function, min_time=0.2):
+    """Return the seconds a call to function takes, averaged over enough calls."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def generate_tree(directory, files):
+    """Write a package of the given number of python files, return the path of its __init__.py."""
+    root = os.path.join(directory, PACKAGE)
+    os.makedirs(root)
+
+    remaining = files - 1  # The top level __init__.py
+    subpackages = []
+    while remaining > 0:
+        count = min(MODULES_PER_PACKAGE, remaining)
+        name = 's%03d' % len(subpackages)
+        os.makedirs(os.path.join(root, name))
+
+        modules = ['m%03d' % i for i in range(count - 1)]
+        for module in modules:
+            write_module(os.path.join(root, name, module + '.py'), 0)
+        with open(os.path.join(root, name, '__init__.py'), 'w') as f:
+            if modules:
+                f.write('from . import %s\n' % ', '.join(modules))
+            f.write('VALUE = %d\n' % len(modules))
+
+        subpackages.append(name)
+        remaining -= count
+
+    # Registered classes, kept by partial reloads unless the watcher knows better.
+    with open(os.path.join(root, 'ops.py'), 'w') as f:
+        f.write(OPERATORS)
+
+    with open(os.path.join(root, '__init__.py'), 'w') as f:
+        for i, name in enumerate(subpackages):
+            f.write('from .%s import VALUE as VALUE_%d\n' % (name, i))
+        f.write('TOTAL = %d\n' % len(subpackages))
+        f.write(REGISTER)
+
+    return os.path.join(root, '__init__.py')
+
+
+def write_module(path, value):
+    with open(path, 'w') as f:
+        f.write(MODULE.format(value=value))
+
+
+def leaf_module(filepath):
+    """Return a module of the generated package that nothing else depends on much."""
+    root = os.path.dirname(filepath)
+    for name in sorted(os.listdir(root)):
+        subpackage = os.path.join(root, name)
+        if os.path.isdir(subpackage):
+            modules = sorted(entry for entry in os.listdir(subpackage) if entry.startswith('m'))
+            if modules:
+                return os.path.join(subpackage, modules[0])
+    return filepath
+
+
+class Bench:
+    """Run the benchmarks against the addon, loaded with the bpy stand-in."""
+
+    def __init__(self, repeat=5, idle_time=2.0):
+        self.repeat = repeat
+        self.idle_time = idle_time
+
+        sys.path.insert(0, os.path.join(HERE, 'fakebpy'))
+        sys.path.insert(0, os.path.join(HERE, 'fakedebugpy'))
+        import bpy
+        self.bpy = bpy
+        # With a UI, so the reloads' output goes through the console sink as in Blender.
+        bpy.app.background = False
+
+        self.addon = None
+        self.startup = {}
+
+    def load(self):
+        start = time.perf_counter()
+        spec = importlib.util.spec_from_file_location(
+            ADDON, os.path.join(ROOT, '__init__.py'), submodule_search_locations=[ROOT]
+        )
+        self.addon = importlib.util.module_from_spec(spec)
+        sys.modules[ADDON] = self.addon
+        spec.loader.exec_module(self.addon)
+        self.startup['import'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.addon.register()
+        self.startup['register'] = time.perf_counter() - start
+
+        # The watcher and the debugger are only loaded once used.
+        lazy = sys.modules[ADDON + '.lazy']
+        for name in ('watcher', 'debugger'):
+            start = time.perf_counter()
+            lazy.subsystems[name].load()
+            self.startup['load_' + name] = time.perf_counter() - start
+            self.startup[name + '_import'] = lazy.startup_times[name + ' import']
+            self.startup[name + '_register'] = lazy.startup_times[name + ' register']
+
+    def unload(self):
+        start = time.perf_counter()
+        self.addon.unregister()
+        self.startup['unregister'] = time.perf_counter() - start
+
+    @property
+    def watcher(self):
+        return sys.modules[ADDON + '.watcher']
+
+    @property
+    def metrics(self):
+        return sys.modules[ADDON + '.metrics'].reload_metrics
+
+    def pump_until(self, condition, timeout=60.0):
+        """Run the timers until condition() is true, return False on timeout."""
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            wait = self.bpy.app.timers.pump()
+            if condition():
+                return True
+            time.sleep(min(max(wait, 0.0), 0.001))
+        return False
+
+    def next_record(self):
+        """Pump until a new reload is done, return its metrics record."""
+        last = self.metrics.records[-1] if self.metrics.records else None
+
+        def done():
+            records = self.metrics.records
+            return records and records[-1] is not last and records[-1].ready is not None
+        if not self.pump_until(done):
+            raise RuntimeError('The watcher did not reload in time.')
+        record = self.metrics.records[-1]
+        if not record.ok:
+            raise RuntimeError('Reloading %s failed.' % ', '.join(record.targets))
+        return record
+
+    def start_watcher(self, filepath, backend):
+        settings = self.bpy.context.scene.sw_settings
+        settings.filepath = filepath
+        settings.backend = backend
+        settings.reload_delay = 0.0  # Measure the watcher, not the debounce.
+        settings.use_py_console = True
+
+        start = time.perf_counter()
+        self.bpy.ops.wm.sw_watch_start()
+        record = self.next_record()  # The initial load.
+        return {'ready': time.perf_counter() - start, 'compile': record.phases['compile'], 'exec': record.phases['exec']}
+
+    def stop_watcher(self):
+        self.bpy.ops.wm.sw_watch_end()
+        self.pump_until(lambda: self.watcher._watcher is None, 5.0)
+
+    def run_tree(self, size, directory):
+        filepath = generate_tree(directory, size)
+        result = {'files': size}
+
+        log('  index')
+        result['index'] = self.bench_index(filepath)
+
+        for backend in ('POLLING', 'AUTO'):
+            log('  watcher, %s backend' % backend)
+            with quiet():
+                result['start_' + backend.lower()] = self.start_watcher(filepath, backend)
+                try:
+                    result['idle_' + backend.lower()] = self.bench_idle()
+                    result['latency_' + backend.lower()] = self.bench_latency(filepath)
+                    if backend == 'AUTO':
+                        result['get_paths'] = per_call(lambda: self.watcher._watcher.get_paths(filepath))
+                        result['remove_cached_mods'] = self.bench_remove_cached_mods(filepath)
+                        result['reload'] = self.bench_reload()
+                finally:
+                    self.stop_watcher()
+        return result
+
+    def bench_index(self, filepath):
+        """The cost of walking the tree, what the watcher does on start and on changes."""
+        tree_index = sys.modules[ADDON + '.tree_index']
+        notify = sys.modules[ADDON + '.notify']
+
+        index = tree_index.TreeIndex(filepath)
+        cold = per_call(lambda: tree_index.TreeIndex(filepath))
+        rescan = per_call(lambda: index.refresh())
+        hinted = per_call(lambda: index.refresh([leaf_module(filepath)]))
+
+        # Polling an idle tree once the polls have backed off: seconds spent and stat calls, per second.
+        backend = notify.PollingBackend()
+        backend.watch(index.files, index.dirs)
+        backend._last_change -= backend.idle_step * backend.max_backoff
+        calls = [0]
+        mtime = notify._mtime
+
+        def counting_mtime(path):
+            calls[0] += 1
+            return mtime(path)
+        notify._mtime = counting_mtime
+        polling = 0.0
+        try:
+            end = time.monotonic() + self.idle_time
+            while time.monotonic() < end:
+                time.sleep(backend.poll_delay())
+                start = time.perf_counter()
+                backend.poll()
+                polling += time.perf_counter() - start
+        finally:
+            notify._mtime = mtime
+        backend.close()
+
+        return {'build': cold, 'rescan': rescan, 'hinted_refresh': hinted,
+                'poll_per_second': polling / self.idle_time, 'stats_per_second': calls[0] / self.idle_time}
+
+    def bench_idle(self):
+        """CPU used while nothing changes, per second of wall time."""
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        end = time.monotonic() + self.idle_time
+        self.pump_until(lambda: time.monotonic() >= end, self.idle_time + 1.0)
+        return (time.process_time() - cpu) / (time.perf_counter() - wall)
+
+    def bench_latency(self, filepath):
+        """Seconds from writing a file to the change being detected and to the reload being done."""
+        path = leaf_module(filepath)
+        detected = []
+        ready = []
+        for i in range(self.repeat):
+            time.sleep(0.05)  # Let the previous reload settle.
+            start = time.monotonic()
+            write_module(path, i + 1)
+            record = self.next_record()
+            detected.append(record.detected - start)
+            ready.append(record.ready - start)
+
+        result = {'detected': summary(detected), 'ready': summary(ready)}
+        for tier, (median, longest, count) in self.watcher._watcher.detection_latency().items():
+            result['detected_' + tier.lower()] = {'median': median, 'max': longest, 'count': count}
+        return result
+
+    def bench_debugger(self, directory):
+        """Finding debugpy, starting the debug server and following the connection."""
+        import debugpy
+        discovery = sys.modules[ADDON + '.discovery']
+        sys.modules[ADDON + '.ports'].REGISTRY_PATH = os.path.join(directory, 'debug_ports.json')
+        prefs = self.bpy.context.preferences.addons[ADDON].preferences
+        prefs.path = os.path.join(HERE, 'fakedebugpy')
+        scene = self.bpy.context.scene
+        result = {'find_debugpy': per_call(discovery.find_debugpy)}
+
+        start = time.perf_counter()
+        self.bpy.ops.debug.connect_debugger_vscode()
+        result['server_start'] = time.perf_counter() - start
+        result['idle_waiting'] = self.bench_idle()
+
+        start = time.monotonic()
+        debugpy.attach()
+        self.pump_until(lambda: scene.dvc_connected, 5.0)
+        result['attach_detected'] = time.monotonic() - start
+        result['idle_attached'] = self.bench_idle()
+
+        start = time.monotonic()
+        debugpy.detach()
+        self.pump_until(lambda: not scene.dvc_connected, 5.0)
+        result['detach_detected'] = time.monotonic() - start
+        result['idle_detached'] = self.bench_idle()
+        return result
+
+    def bench_remove_cached_mods(self, filepath):
+        """Purging all the modules of the package from sys.modules."""
+        watcher = self.watcher._watcher
+        finder = watcher._finder
+        owned = dict(finder.owned)
+        modules = dict((name, sys.modules[name]) for name in owned if name in sys.modules)
+        modules[PACKAGE] = sys.modules[PACKAGE]
+
+        times = []
+        for i in range(max(self.repeat, 20)):
+            sys.modules.update(modules)
+            finder.owned.update(owned)
+            start = time.perf_counter()
+            watcher.remove_cached_mods(filepath)
+            times.append(time.perf_counter() - start)
+
+        # Leave the package loaded for the next benchmark.
+        sys.modules.update(modules)
+        finder.owned.update(owned)
+        return dict(summary(times), modules=len(modules))
+
+    def bench_reload(self):
+        """Full reloads of the whole package, back to back."""
+        records = []
+        start = time.perf_counter()
+        for i in range(self.repeat):
+            self.bpy.ops.wm.sw_reload()
+            records.append(self.next_record())
+        elapsed = time.perf_counter() - start
+
+        result = {'per_second': self.repeat / elapsed}
+        for phase in ('purge', 'exec', 'output'):
+            result[phase] = summary([record.phases[phase] for record in records])
+        return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ('git', 'rev-parse', '--short', 'HEAD'), cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(data, prefix=''):
+    """Return {dotted key: number} for every number in a results file."""
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old, new):
+    """Print the change of every timing between two results."""
+    old = flatten({'startup': old['startup'], 'trees': old['trees'], 'debugger': old.get('debugger', {})})
+    new = flatten({'startup': new['startup'], 'trees': new['trees'], 'debugger': new.get('debugger', {})})
+    width = max(len(key) for key in new)
+    for key in sorted(new):
+        if key in old and old[key]:
+            print('%-*s %12.6g %12.6g %+8.1f%%' % (width, key, old[key], new[key], (new[key] / old[key] - 1) * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the script watcher without Blender.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000],
+                        help='Number of files of the generated packages')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions of the slower measurements')
+    parser.add_argument('--idle', type=float, default=2.0, help='Seconds to measure the idle cost over')
+    parser.add_argument('--output', default=os.path.join(HERE, 'results', 'benchmark-results.json'),
+                        help='Where to save the results')
+    parser.add_argument('--compare', help='Results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    bench = Bench(args.repeat, args.idle)
+    with quiet():
+        bench.load()
+
+    trees = {}
+    try:
+        log('debugger')
+        directory = tempfile.mkdtemp(prefix='sw_bench_')
+        try:
+            with quiet():
+                debugger = bench.bench_debugger(directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        for size in args.sizes:
+            log('%d files' % size)
+            directory = tempfile.mkdtemp(prefix='sw_bench_')
+            try:
+                trees[str(size)] = bench.run_tree(size, directory)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+    finally:
+        with quiet():
+            bench.unload()
+
+    results = {
+        'schema': SCHEMA,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'startup': bench.startup,
+        'debugger': debugger,
+        'trees': trees,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    log('Results saved to', args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
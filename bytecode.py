@@ -0,0 +1,237 @@
+"""
+bytecode.py: Compiled code cache for the watched scripts.
+
+Code objects are cached by path and validated against the file's size,
+mtime and content hash, so a reload only has to run exec. New versions are
+compiled on a worker thread as soon as a change is detected, which also lets
+syntax errors be reported before any module is torn down.
+
+When watching starts, the whole package is compiled to its __pycache__ by a
+pool of processes first, so filling the cache only has to load the .pyc files.
+"""
+
+import collections
+import hashlib
+import importlib.util
+import marshal
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+
+# Below this many files, starting the processes costs more than it saves.
+POOL_MIN_FILES = 100
+
+
+def source_digest(data):
+    """Return a fast hash of the given source bytes."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def write_pycache(paths, workers=None, timeout=300):
+    """Compile the python files among paths to their __pycache__ in a pool of processes.
+
+    The .pyc files are checked against a hash of the source, so they are
+    never used for a file that changed within the same second. Return False
+    if the files weren't compiled, they are then compiled in process.
+    """
+    if sys.dont_write_bytecode:
+        return False
+
+    # compileall rewrites hash checked .pyc files every time, only send it what is out of date.
+    paths = [path for path in paths if path.endswith('.py') and not _pycache_current(path)]
+    if len(paths) < POOL_MIN_FILES:
+        return False
+
+    # Older versions of Blender point sys.executable to blender itself.
+    if not os.path.basename(sys.executable).lower().startswith('python'):
+        return False
+
+    # Isolated interpreters rather than multiprocessing, which would run Blender's __main__ again.
+    command = (sys.executable, '-I', '-m', 'compileall', '-qq', '--invalidation-mode', 'checked-hash', '-i', '-')
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths) // POOL_MIN_FILES))
+
+    processes = []
+    try:
+        for i in range(workers):
+            process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            processes.append(process)
+            process.stdin.write('\n'.join(paths[i::workers]).encode('utf-8', 'surrogateescape'))
+            process.stdin.close()
+
+        end = time.monotonic() + timeout
+        for process in processes:
+            # Files that don't compile make compileall fail, the others are written anyway.
+            process.wait(max(0.0, end - time.monotonic()))
+    except (OSError, subprocess.SubprocessError):
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+        return False
+    return True
+
+
+def load_pycache(path, data):
+    """Return the code object of the .pyc file of path if it was compiled from data, else None."""
+    pyc = _read_pycache(path, data)
+    if pyc is None:
+        return None
+    try:
+        return marshal.loads(pyc[16:])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def _read_pycache(path, data, size=-1):
+    """Return the content of the .pyc file of path if it was compiled from data, else None.
+
+    Only .pyc files checked against a hash of the source are used, a
+    timestamp can't tell whether the file changed within the same second.
+    """
+    try:
+        with open(importlib.util.cache_from_source(path), 'rb') as f:
+            pyc = f.read(size)
+    except (OSError, NotImplementedError):
+        return None
+
+    flags = int.from_bytes(pyc[4:8], 'little')
+    if pyc[:4] != importlib.util.MAGIC_NUMBER or not flags & 0b1:
+        return None
+    if pyc[8:16] != importlib.util.source_hash(data):
+        return None
+    return pyc
+
+
+def _pycache_current(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return True  # Nothing to compile.
+    return _read_pycache(path, data, 16) is not None
+
+
+_Entry = collections.namedtuple('_Entry', 'size mtime digest code')
+
+
+class CodeCache:
+    """LRU cache of code objects keyed by path, size, mtime and content hash."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+
+        self._entries = collections.OrderedDict()  # Path -> _Entry
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        """Return the code object for path, compiling it if it isn't cached.
+
+        Raises OSError if the file can't be read and SyntaxError if it doesn't compile.
+        """
+        st = os.stat(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.size == st.st_size and entry.mtime == st.st_mtime_ns:
+                self._entries.move_to_end(path)
+                return entry.code
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = source_digest(data)
+
+        if entry is not None and entry.digest == digest:
+            # Touched but not changed, keep the code we have.
+            code = entry.code
+        else:
+            # Not seen yet, the .pyc file written on watch start saves the compile.
+            code = load_pycache(path, data) if entry is None else None
+            if code is None:
+                code = compile(data, path, 'exec', dont_inherit=True)
+
+        with self._lock:
+            self._entries[path] = _Entry(st.st_size, st.st_mtime_ns, digest, code)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return code
+
+    def discard(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Precompiler:
+    """Compile python files into a CodeCache on a worker thread."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+        self._queue = queue.Queue()
+        self._errors = {}  # Path -> formatted syntax error.
+        self._pending = 0
+        self._idle = threading.Condition()
+        self.busy_time = 0.0  # Seconds spent compiling.
+
+        self._thread = threading.Thread(target=self._run, name='ScriptWatcherCompile', daemon=True)
+        self._thread.start()
+
+    def submit(self, paths):
+        """Queue the python files among paths for compiling."""
+        with self._idle:
+            for path in paths:
+                if path.endswith('.py'):
+                    self._pending += 1
+                    self._queue.put(path)
+
+    def wait(self, timeout=None):
+        """Block until everything submitted so far is compiled, return False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def errors(self, paths=None):
+        """Return {path: error message} for the files that failed to compile."""
+        with self._idle:
+            if paths is None:
+                return dict(self._errors)
+            return dict((path, self._errors[path]) for path in paths if path in self._errors)
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+
+            error = None
+            start = time.perf_counter()
+            try:
+                self.cache.get(path)
+            except SyntaxError as e:
+                error = ''.join(traceback.format_exception_only(type(e), e))
+            except (OSError, ValueError):
+                self.cache.discard(path)  # Removed or unreadable, the reload will tell.
+
+            with self._idle:
+                self.busy_time += time.perf_counter() - start
+                if error is None:
+                    self._errors.pop(path, None)
+                else:
+                    self._errors[path] = error
+                self._pending -= 1
+                self._idle.notify_all()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(1.0)
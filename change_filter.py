@@ -0,0 +1,100 @@
+"""
+change_filter.py: Drop changes that didn't change a file's content.
+
+Editors, formatters and git like to bump modification times without
+touching the content. The filter remembers the size and a digest of every
+file and only lets a modification through when the content really changed.
+Optionally comments and whitespace are ignored by hashing the token stream.
+"""
+
+import hashlib
+import io
+import os
+import tokenize
+
+from .bytecode import source_digest
+
+
+# Tokens that don't change what the code does.
+_FORMATTING_TOKENS = frozenset((tokenize.COMMENT, tokenize.NL, tokenize.ENCODING))
+# Tokens that matter, but whose text is only whitespace.
+_LAYOUT_TOKENS = frozenset((tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT))
+
+
+def token_digest(data):
+    """Return a digest of the python source, ignoring comments and whitespace."""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        for token in tokenize.tokenize(io.BytesIO(data).readline):
+            if token.type in _FORMATTING_TOKENS:
+                continue
+            if token.type in _LAYOUT_TOKENS:
+                digest.update(b'%d\0' % token.type)
+            else:
+                digest.update(b'%d\0%s\0' % (token.type, token.string.encode('utf-8', 'surrogateescape')))
+    except (tokenize.TokenError, SyntaxError, UnicodeDecodeError):
+        # Can't be tokenized, fall back to the raw content.
+        return source_digest(data)
+    return digest.digest()
+
+
+class ChangeFilter:
+    """Tell which of the reported changes actually changed the content."""
+
+    def __init__(self, ignore_formatting=False):
+        self.ignore_formatting = ignore_formatting
+        self._seen = {}  # Path -> (size, digest)
+
+    def prime(self, paths):
+        """Remember the current content of paths, so the first change can be checked too."""
+        for path in paths:
+            try:
+                size = os.stat(path).st_size
+                self._seen[path] = (size, self._digest(path))
+            except OSError:
+                pass
+
+    def changed(self, path):
+        """Return True if the content of path differs from the last time we looked."""
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            self._seen.pop(path, None)
+            return True
+
+        last = self._seen.get(path)
+
+        # The digest is always taken, the next change has to be compared against it.
+        try:
+            digest = self._digest(path)
+        except OSError:
+            self._seen.pop(path, None)
+            return True
+        self._seen[path] = (size, digest)
+
+        if last is None:
+            return True
+        # A different size is enough to know, unless formatting doesn't count.
+        if last[0] != size and not self.ignore_formatting:
+            return True
+        return last[1] != digest
+
+    def filter(self, diff):
+        """Return the paths of a TreeDiff whose content changed."""
+        paths = diff.added + diff.removed
+        for path in diff.removed:
+            self._seen.pop(path, None)
+        for path in diff.added:
+            self.changed(path)
+
+        for path in diff.modified:
+            if self.changed(path):
+                paths.append(path)
+        return paths
+
+    def _digest(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if self.ignore_formatting and path.endswith('.py'):
+            return token_digest(data)
+        return source_digest(data)
@@ -0,0 +1,127 @@
+"""
+console_output.py: Batched, bounded output to Blender's python consoles.
+
+Appending to a console goes through an operator, and every call needs a
+context override. The sink overrides the context once per chunk of lines,
+caps how much of a reload's output reaches the consoles and spreads the work
+over several timer ticks, so a chatty script doesn't freeze the UI.
+"""
+
+import collections
+import time
+
+import bpy
+
+from . import timers
+from .utils import operator_with_context_batch
+
+
+def add_scrollback(ctx, text, text_type):
+    operator_with_context_batch(
+        bpy.ops.console.scrollback_append, ctx,
+        [dict(text=line.replace('\t', '    '), type=text_type) for line in text]
+    )
+
+
+def console_areas():
+    """Return (window, area) for every python console in every window."""
+    areas = []
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'CONSOLE':
+                areas.append((window, area))
+    return areas
+
+
+class ConsoleSink:
+    """Send output lines to every python console, a chunk per timer tick."""
+    interval = 0.01
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.max_lines = 1000  # Per stream, per reload.
+
+        self._lines = collections.deque()  # (text, type)
+        self._written = collections.Counter()  # Lines accepted per type for the current reload.
+        self._done = []  # Callbacks waiting for the queued lines to be written.
+        self._busy_time = 0.0  # Seconds spent writing since the queue was last empty.
+
+        # Keep a single bound method around, timers are unregistered by identity.
+        self._timer = self._flush
+
+    @property
+    def pending(self):
+        return len(self._lines)
+
+    def begin(self, max_lines=None):
+        """Start the output of a new reload."""
+        if max_lines is not None:
+            self.max_lines = max_lines
+        self._written.clear()
+
+    def write(self, lines, text_type):
+        """Queue lines of the given type ('OUTPUT', 'ERROR'...)."""
+        truncated = 0
+        for line in lines:
+            if self._written[text_type] < self.max_lines:
+                self._written[text_type] += 1
+                self._lines.append((line, text_type))
+            else:
+                truncated += 1
+
+        if truncated:
+            self._lines.append(('... %d lines truncated' % truncated, text_type))
+
+    def end(self, done=None):
+        """Finish the output of the reload and start writing it out.
+
+        done is called with the seconds spent writing once all the queued lines are out.
+        """
+        if done is not None:
+            self._done.append(done)
+
+        if not self._lines:
+            self._finish()
+        elif not timers.is_registered(self._timer):
+            timers.register(self._timer, first_interval=0)
+
+    def clear(self):
+        self._lines.clear()
+        self._done = []
+        self._busy_time = 0.0
+        if timers.is_registered(self._timer):
+            timers.unregister(self._timer)
+
+    def _finish(self):
+        done, self._done = self._done, []
+        busy_time, self._busy_time = self._busy_time, 0.0
+        for callback in done:
+            callback(busy_time)
+
+    def _flush(self):
+        start = time.perf_counter()
+        chunk = []
+        while self._lines and len(chunk) < self.chunk_size:
+            chunk.append(self._lines.popleft())
+
+        # Group consecutive lines of the same type, one override per group and console.
+        groups = []
+        for text, text_type in chunk:
+            if groups and groups[-1][0] == text_type:
+                groups[-1][1].append(text)
+            else:
+                groups.append((text_type, [text]))
+
+        for window, area in console_areas():
+            ctx = {"window": window, "screen": window.screen, "area": area}
+            for text_type, text in groups:
+                add_scrollback(ctx, text, text_type)
+
+        self._busy_time += time.perf_counter() - start
+        if self._lines:
+            return self.interval
+        self._finish()
+        return None
+
+
+console_sink = ConsoleSink()
@@ -19,78 +19,20 @@ Created by Alan North
 """
 
 import os
-import re
-import subprocess
 import sys
+import threading
+import time
 
 import bpy
 
-from .utils import make_annotations, update_ui_panel
-
-# finds path to debugpy if it exists
-def check_for_debugpy():
-   pip_info = None
-   try:
-      pip_info = subprocess.Popen(
-          "pip show debugpy",
-          shell=True,
-          stdout=subprocess.PIPE,
-          stderr=subprocess.PIPE
-      )
-   except Exception as e:
-      print(e)
-      pass
-   if pip_info is not None:
-      pip_info = str(pip_info.communicate()[0], "utf-8")
-      pip_info = re.sub("\\\\", "/", pip_info)
-      #extract path up to last slash
-      match = re.search("Location: (.*)", pip_info)
-      #normalize slashes
-      if match is not None:
-         match = match.group(1).rstrip()
-         if os.path.exists(match+"/debugpy"):
-            return match
-
-  # commands to check
-   checks = [
-       ["where", "python"],
-       ["whereis", "python"],
-       ["which", "python"],
-   ]
-   location = None
-   for command in checks:
-      try:
-         location = subprocess.Popen(
-             command,
-             shell=True,
-             stdout=subprocess.PIPE,
-             stderr=subprocess.PIPE
-         )
-      except Exception:
-         continue
-      if location is not None:
-         location = str(location.communicate()[0], "utf-8")
-         #normalize slashes
-         location = re.sub("\\\\", "/", location)
-         #extract path up to last slash
-         match = re.search(".*(/)", location)
-         if match is not None:
-            match = match.group(1)
-            if os.path.exists(match+"lib/site-packages/debugpy"):
-               match = match+"lib/site-packages"
-               return match
-
-   # check in path just in case PYTHONPATH happens to be set
-   # this is not going to work because Blender's sys.path is different
-   for path in sys.path:
-      path = path.rstrip("/")
-      if os.path.exists(path+"/debugpy"):
-         return path
-      if os.path.exists(path+"/site-packages/debugpy"):
-         return path+"/site-packages"
-      if os.path.exists(path+"/lib/site-packages/debugpy"):
-         return path+"lib/site-packages"
-   return "debugpy not Found"
+from . import ports, timers, tracing
+from .discovery import DEBUGPY_NOT_FOUND, find_debugpy
+from .redraw import drawn, mark_dirty
+from .utils import make_annotations
+
+
+debugpy = None  # Imported by DVC_OT_DebugServerStart.
+server_port = None  # The port the debug server listens on, None until started.
 
 
 @make_annotations
@@ -100,7 +42,7 @@ class DebuggerPreferences(bpy.types.AddonPreferences):
    path = bpy.props.StringProperty(
       name="Location of debugpy (site-packages folder)",
       subtype="DIR_PATH",
-      default=check_for_debugpy()
+      default=find_debugpy() or DEBUGPY_NOT_FOUND
    )
 
    timeout = bpy.props.IntProperty(
@@ -130,55 +72,134 @@ class DebuggerPreferences(bpy.types.AddonPreferences):
 
 
 
-def check_done(i, modal_limit, prefs, context):
-    if i == 0 or i % 60 == 0:
-        print("Waiting... (on port "+str(prefs.port)+")")
-    if i > modal_limit:
-        print("Attach Confirmation Listener Timed Out")
-        context.scene.dvc_waiting_for_connection = False
-        update_ui_panel()
-        return {"CANCELLED"}
-    if not debugpy.is_client_connected():
-        return {"PASS_THROUGH"}
-
-    context.scene.dvc_connected = True
-    update_ui_panel()
-    print('Debugger is Attached')
-    return {"FINISHED"}
+class ConnectionMonitor:
+    """Follow the debugger's connection from a thread.
+
+    The thread blocks in debugpy.wait_for_client() until a client attaches,
+    then checks for the detach now and then, and goes back to waiting. The
+    main thread picks up the state the thread leaves from a timer, which
+    only runs while waiting for the attach or while attached. Neither exist
+    before a debug server is started.
+    """
+
+    interval = 0.05  # Seconds between checks for a detach, and handoffs while waiting for the attach.
+    attached_interval = 0.1  # Seconds between handoffs while attached.
+
+    def __init__(self):
+        self.connected = False
+        self._debugpy = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._deadline = None  # When the wait for a client times out, None when not waiting.
+
+    def start(self, debugpy, port, timeout):
+        """Wait for a client of the server started on port, for timeout seconds."""
+        self._debugpy = debugpy
+        self._deadline = time.monotonic() + timeout
+        print("Waiting for the debugger... (on port %d)" % port)
+
+        # A thread that couldn't be stopped is still waiting for a client, keep it.
+        self._stopping.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="DebuggerMonitor", daemon=True)
+            self._thread.start()
+        self.wake()
+
+    def wake(self):
+        """Have the main thread catch up with the thread, if it isn't already following it."""
+        if self._debugpy is not None and not timers.is_registered(self._handoff):
+            timers.register(self._handoff, persistent=True)
+
+    def stop(self):
+        self._stopping.set()
+        self._deadline = None
+        cancel = getattr(getattr(self._debugpy, "wait_for_client", None), "cancel", None)
+        if cancel is not None:
+            cancel()
+        if timers.is_registered(self._handoff):
+            timers.unregister(self._handoff)
+
+    def _run(self):
+        debugpy = self._debugpy
+        try:
+            while not self._stopping.is_set():
+                if not debugpy.is_client_connected():
+                    # Returns once a client attached, or the wait was cancelled.
+                    debugpy.wait_for_client()
+                    continue
+                self.connected = True
+                while not self._stopping.wait(self.interval) and debugpy.is_client_connected():
+                    pass
+                self.connected = False
+        except Exception:
+            import traceback
+            traceback.print_exc()
+
+    def _handoff(self):
+        """Bring the scene up to date with the thread, on the main thread."""
+        scene = bpy.context.scene
+        changed = False
+        if scene.dvc_connected != self.connected:
+            scene.dvc_connected = self.connected
+            print("Debugger is Attached" if self.connected else "Debugger was Detached")
+            if self.connected:
+                tracing.untrace()  # debugpy traces the main thread again when a client attaches.
+                self._deadline = None
+                scene.dvc_waiting_for_connection = False
+            changed = True
+
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            # The thread still waits, drawing the panel or checking again picks up a late attach.
+            print("Attach Confirmation Listener Timed Out")
+            self._deadline = None
+            scene.dvc_waiting_for_connection = False
+            changed = True
+
+        if changed:
+            mark_dirty("debugger")
+        if self.connected:
+            return self.attached_interval
+        if self._deadline is not None:
+            return self.interval
+        return None  # Neither waiting nor attached, nothing to follow until wake().
+
+
+monitor = ConnectionMonitor()
+
+
+def set_trace_scope(scope):
+    """Trace all the code ('ALL') or only the watched scripts ('WATCHED'), once the server runs."""
+    if scope == 'WATCHED':
+        tracing.start(debugpy)
+        tracing.on_roots_changed = _update_roots
+    else:
+        tracing.stop()
+        tracing.on_roots_changed = None
+    _update_roots(tracing.roots)
+
+
+def _update_roots(roots):
+    """Scope the attach configurations to the watched directories."""
+    ports.set_roots(roots if tracing.scoped() else [])
+    prefs = bpy.context.preferences.addons[__package__].preferences
+    if prefs.launch_json:
+        ports.update_launch_json(bpy.path.abspath(prefs.launch_json))
 
 
 class DVC_OT_DebuggerCheck(bpy.types.Operator):
    bl_idname = "debug.check_for_debugger"
    bl_label = "Debug: Check if VS Code is Attached"
-   bl_description = "Starts modal timer that checks if debugger attached until attached or until timeout"
-
-   _timer = None
-   count = 0
-   modal_limit = 20*60
-
-   # call check_done
-   def modal(self, context, event):
-      self.count = self.count + 1
-      if event.type == "TIMER":
-         prefs = bpy.context.preferences.addons[__package__].preferences
-         return check_done(self.count, self.modal_limit, prefs, context)
-      return {"PASS_THROUGH"}
+   bl_description = "Waits for the debugger to attach, until the timeout"
 
    def execute(self, context):
-      # set initial variables
-      self.count = 0
+      if debugpy is None:
+         self.report({"ERROR"}, "No debug server was started.")
+         return {"CANCELLED"}
       prefs = bpy.context.preferences.addons[__package__].preferences
-      self.modal_limit = prefs.timeout*60
-
-      wm = context.window_manager
-      self._timer = wm.event_timer_add(0.1, window=context.window)
-      wm.modal_handler_add(self)
-      return {"RUNNING_MODAL"}
-
-   def cancel(self, context):
-      print("Debugger Confirmation Cancelled")
-      wm = context.window_manager
-      wm.event_timer_remove(self._timer)
+      context.scene.dvc_waiting_for_connection = not context.scene.dvc_connected
+      mark_dirty("debugger")
+      monitor.start(debugpy, server_port, prefs.timeout)
+      return {"FINISHED"}
 
 
 @make_annotations
@@ -200,7 +221,7 @@ class DVC_OT_DebugServerStart(bpy.types.Operator):
         debugpy_port = prefs.port
 
         #actually check debugpy is still available
-        if debugpy_path == "debugpy not found":
+        if debugpy_path == DEBUGPY_NOT_FOUND:
             self.report({"ERROR"}, "Couldn't detect debugpy, please specify the path manually in the addon preferences or reload the addon if you installed debugpy after enabling it.")
             return {"CANCELLED"}
 
@@ -211,22 +232,35 @@ class DVC_OT_DebugServerStart(bpy.types.Operator):
         if not any(debugpy_path in p for p in sys.path):
             sys.path.append(debugpy_path)
 
-        global debugpy #so we can do check later
+        global debugpy, server_port #so we can do check later
         import debugpy
 
         # can only be attached once, no way to detach (at least not that I understand?)
-        try:
-            debugpy.listen(("localhost", debugpy_port))
-        except:
-            print("Server already running.")
+        if server_port is not None:
+            print("Server already running on port %d." % server_port)
+        else:
+            try:
+                if prefs.port_mode == 'AUTO':
+                    server_port = ports.listen_on_free_port(
+                        lambda port: debugpy.listen(("localhost", port)),
+                        prefs.port_range_start, prefs.port_range_end
+                    )
+                else:
+                    debugpy.listen(("localhost", debugpy_port))
+                    server_port = debugpy_port
+                    ports.record(server_port)
+            except (OSError, RuntimeError) as e:
+                self.report({"ERROR"}, "Couldn't start the debug server: %s" % e)
+                return {"CANCELLED"}
+            self.report({"INFO"}, "Debug server listening on port %d" % server_port)
+
+        set_trace_scope(prefs.trace_scope)
 
         if (self.waitForClient):
             self.report({"INFO"}, "Blender Debugger for VSCode: Awaiting Connection")
             debugpy.wait_for_client()
 
         # call our confirmation listener
-        context.scene.dvc_waiting_for_connection = True
-        update_ui_panel()
         bpy.ops.debug.check_for_debugger()
         return {"FINISHED"}
 
@@ -238,9 +272,15 @@ class DVC_PT_DebuggerPanel(bpy.types.Panel):
     bl_category = "Code Tools"
 
     def draw(self, context):
+        drawn("debugger", context)
         layout = self.layout
         layout.operator("debug.connect_debugger_vscode", text="Start Debug Server", icon='SCRIPTPLUGINS')
 
+        if server_port is not None:
+            layout.label(text="Listening on port %d" % server_port)
+            if monitor.connected != context.scene.dvc_connected:
+                monitor.wake()
+
         if context.scene.dvc_connected:
            layout.label(text="Debugger connected!", icon='INFO')
         else:
@@ -250,33 +290,6 @@ class DVC_PT_DebuggerPanel(bpy.types.Panel):
                 layout.label(text="Debugger not running ...", icon='INFO')
 
 
-def check_debugger_was_detached():
-    context = bpy.context
-
-    try:
-        import debugpy
-
-        if context.scene.dvc_connected:
-            # we were previously connected
-            if not debugpy.is_client_connected():
-                # we are now disconnected
-                context.scene.dvc_connected = False
-                update_ui_panel()
-        else:
-            # we were previously disconnected
-            if debugpy.is_client_connected():
-                # we are not connected    
-                context.scene.dvc_connected = True
-                update_ui_panel()
-
-    except ImportError:
-       pass
-    except Exception:
-        import traceback
-        traceback.print_exc()
-    
-    return 2 # run the timer every 2 seconds
-
 classes = (
    DebuggerPreferences,
    DVC_OT_DebuggerCheck,
@@ -292,8 +305,6 @@ def register_debugger():
 
     bpy.types.Scene.dvc_waiting_for_connection = bpy.props.BoolProperty(default=False)
     bpy.types.Scene.dvc_connected = bpy.props.BoolProperty(default=False)
-    if not bpy.app.timers.is_registered(check_debugger_was_detached):
-        bpy.app.timers.register(check_debugger_was_detached)
 
 
 def unregister_debugger():
@@ -303,5 +314,6 @@ def unregister_debugger():
 
     del bpy.types.Scene.dvc_waiting_for_connection
     del bpy.types.Scene.dvc_connected
-    if bpy.app.timers.is_registered(check_debugger_was_detached):
-        bpy.app.timers.unregister(check_debugger_was_detached)
+    monitor.stop()
+    tracing.on_roots_changed = None
+    tracing.stop()
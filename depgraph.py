@@ -0,0 +1,138 @@
+"""
+depgraph.py: Import graph of the watched package.
+
+The imports of every module are found by scanning its source with ast, the
+result is cached until the file changes. From the graph we can tell which
+modules have to be reloaded when some of them change: the changed modules
+and every module that imports them, directly or not.
+"""
+
+import ast
+import collections
+import os
+
+
+def module_name(path, root):
+    """Return the dotted module name of a python file below root, or None."""
+    rel, ext = os.path.splitext(os.path.relpath(path, root))
+    if ext != '.py' or rel.startswith(os.pardir):
+        return None
+
+    parts = rel.split(os.sep)
+    if parts[-1] == '__init__':
+        parts.pop()
+    if not parts or not all(part.isidentifier() for part in parts):
+        return None
+    return '.'.join(parts)
+
+
+def scan_imports(source, filename='<unknown>'):
+    """Return the (level, module, names) of every import statement in source."""
+    tree = ast.parse(source, filename)
+
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.append((0, alias.name, ()))
+        elif isinstance(node, ast.ImportFrom):
+            names = tuple(alias.name for alias in node.names if alias.name != '*')
+            imports.append((node.level, node.module or '', names))
+    return imports
+
+
+class ImportGraph:
+    """Which module imports which, within the watched packages."""
+
+    def __init__(self):
+        self.modules = {}  # Module name -> path.
+        self._names = {}  # Path -> module name.
+        self._importers = {}  # Module name -> names of the modules importing it.
+        self._scans = {}  # Path -> ((mtime, size), imports)
+
+    def module_for(self, path):
+        """Return the name of the module loaded from path, or None."""
+        return self._names.get(path)
+
+    def update(self, modules):
+        """Rebuild the graph for the given {module name: path} mapping.
+
+        Only files that changed since they were last scanned are parsed again.
+        """
+        self.modules = dict(modules)
+        self._names = dict((path, name) for name, path in self.modules.items())
+
+        importers = dict((name, set()) for name in self.modules)
+        scans = {}
+        for name, path in self.modules.items():
+            imports = self._scan(path, scans)
+            is_package = os.path.basename(path) == '__init__.py'
+            for target in self._resolve(name, is_package, imports):
+                if target != name:
+                    importers[target].add(name)
+
+        self._scans = scans
+        self._importers = importers
+
+    def importers(self, name):
+        """Return the names of the modules directly importing the given module."""
+        return self._importers.get(name, set())
+
+    def dependents(self, names):
+        """Return the given modules plus every module that transitively imports them."""
+        result = set(names)
+        queue = collections.deque(result)
+        while queue:
+            for importer in self._importers.get(queue.popleft(), ()):
+                if importer not in result:
+                    result.add(importer)
+                    queue.append(importer)
+        return result
+
+    def _scan(self, path, scans):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return []
+        version = (st.st_mtime_ns, st.st_size)
+
+        cached = self._scans.get(path)
+        if cached is not None and cached[0] == version:
+            scans[path] = cached
+            return cached[1]
+
+        try:
+            with open(path, 'rb') as f:
+                imports = scan_imports(f.read(), path)
+        except (OSError, SyntaxError, ValueError):
+            imports = []  # Broken files are reported by the reload itself.
+
+        scans[path] = (version, imports)
+        return imports
+
+    def _resolve(self, name, is_package, imports):
+        """Turn the raw imports of a module into names of modules in the graph."""
+        package = name if is_package else name.rpartition('.')[0]
+
+        for level, module, names in imports:
+            if level:
+                parts = package.split('.')
+                if level - 1 >= len(parts):
+                    continue  # Beyond the top level package.
+                base = '.'.join(parts[:len(parts) - (level - 1)])
+                if module:
+                    base = base + '.' + module
+            else:
+                base = module
+
+            # 'from base import name' may import a submodule or a name defined in base.
+            uses_base = not names
+            for imported in names:
+                submodule = base + '.' + imported
+                if submodule in self.modules:
+                    yield submodule
+                else:
+                    uses_base = True
+
+            if uses_base and base in self.modules:
+                yield base
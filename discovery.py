@@ -0,0 +1,253 @@
+"""
+discovery.py: Find the site-packages directory debugpy can be imported from.
+
+find_debugpy() only probes in process and is cheap enough to run at import
+time. When it can't tell, start_debugpy_discovery() runs the full search,
+which asks pip and the shell, on a thread after registration and caches
+its result, so Blender never waits for it.
+
+check_for_debugpy() is Alan North's, moved here from debugger.py (GPL v3,
+see the notice there).
+"""
+
+import glob
+import importlib.machinery
+import importlib.util
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+
+import bpy
+
+from . import timers
+
+
+DEBUGPY_NOT_FOUND = "debugpy not Found"
+
+
+# finds path to debugpy if it exists, the slow way: runs pip and the shell
+def check_for_debugpy():
+   import subprocess  # Only the full search runs processes.
+
+   pip_info = None
+   try:
+      pip_info = subprocess.Popen(
+          "pip show debugpy",
+          shell=True,
+          stdout=subprocess.PIPE,
+          stderr=subprocess.PIPE
+      )
+   except Exception as e:
+      print(e)
+      pass
+   if pip_info is not None:
+      pip_info = str(pip_info.communicate()[0], "utf-8")
+      pip_info = re.sub("\\\\", "/", pip_info)
+      #extract path up to last slash
+      match = re.search("Location: (.*)", pip_info)
+      #normalize slashes
+      if match is not None:
+         match = match.group(1).rstrip()
+         if os.path.exists(match+"/debugpy"):
+            return match
+
+  # commands to check
+   checks = [
+       ["where", "python"],
+       ["whereis", "python"],
+       ["which", "python"],
+   ]
+   location = None
+   for command in checks:
+      try:
+         location = subprocess.Popen(
+             command,
+             shell=True,
+             stdout=subprocess.PIPE,
+             stderr=subprocess.PIPE
+         )
+      except Exception:
+         continue
+      if location is not None:
+         location = str(location.communicate()[0], "utf-8")
+         #normalize slashes
+         location = re.sub("\\\\", "/", location)
+         #extract path up to last slash
+         match = re.search(".*(/)", location)
+         if match is not None:
+            match = match.group(1)
+            if os.path.exists(match+"lib/site-packages/debugpy"):
+               match = match+"lib/site-packages"
+               return match
+
+   # check in path just in case PYTHONPATH happens to be set
+   # this is not going to work because Blender's sys.path is different
+   for path in sys.path:
+      path = path.rstrip("/")
+      if os.path.exists(path+"/debugpy"):
+         return path
+      if os.path.exists(path+"/site-packages/debugpy"):
+         return path+"/site-packages"
+      if os.path.exists(path+"/lib/site-packages/debugpy"):
+         return path+"lib/site-packages"
+   return DEBUGPY_NOT_FOUND
+
+
+def _python_interpreter():
+    """Return the python on the PATH, the one check_for_debugpy() asks about."""
+    return shutil.which("python") or shutil.which("python3") or ""
+
+
+def _site_packages(interpreter):
+    """Return the site-packages directories the interpreter likely uses, without running it."""
+    roots = []
+    if interpreter:
+        # A virtual environment's python links to the base one, both have site-packages.
+        for path in (interpreter, os.path.realpath(interpreter)):
+            bindir = os.path.dirname(path)
+            roots += [bindir, os.path.dirname(bindir)]  # python.exe is in the prefix on windows, in bin/ elsewhere.
+
+    patterns = []
+    for root in roots:
+        patterns.append(os.path.join(root, "lib", "site-packages"))
+        patterns.append(os.path.join(root, "lib", "python3*", "site-packages"))
+        patterns.append(os.path.join(root, "lib", "python3*", "dist-packages"))
+    patterns.append(os.path.join(os.path.expanduser("~"), ".local", "lib", "python3*", "site-packages"))
+    if os.environ.get("APPDATA"):
+        patterns.append(os.path.join(os.environ["APPDATA"], "Python", "Python3*", "site-packages"))
+
+    found = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isdir(path) and path not in found:
+                found.append(path)
+    return found
+
+
+def _cache_path():
+    try:
+        directory = bpy.utils.user_resource("CONFIG", path="blender_vscode_dev", create=True)
+    except Exception:
+        return None
+    return os.path.join(directory, "debugpy_location.json") if directory else None
+
+
+def _cache_key(interpreter, site_dirs):
+    """The cached location holds as long as the interpreter and its site-packages are the same."""
+    mtimes = {}
+    for path in site_dirs:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+    return {"interpreter": interpreter, "site_packages": mtimes}
+
+
+def _load_cache(interpreter, site_dirs):
+    """Return the location found by the last full search, None if it is stale or missing."""
+    path = _cache_path()
+    if path is None:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(cache, dict) or cache.get("key") != _cache_key(interpreter, site_dirs):
+        return None
+    location = cache.get("location")
+    if location != DEBUGPY_NOT_FOUND and not os.path.isdir(os.path.join(str(location), "debugpy")):
+        return None
+    return location
+
+
+def _save_cache(interpreter, site_dirs, location):
+    path = _cache_path()
+    if path is None:
+        return
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"key": _cache_key(interpreter, site_dirs), "location": location}, f)
+    except OSError as e:
+        print("Couldn't save the location of debugpy: %s" % e)
+
+
+def find_debugpy():
+    """Return the directory debugpy can be imported from, without running any process.
+
+    Blender's own sys.path is probed first, then the site-packages of the
+    python on the PATH, then the cache of the last full search. Returns None
+    when only check_for_debugpy() could tell.
+    """
+    try:
+        spec = importlib.util.find_spec("debugpy")
+    except (ImportError, ValueError):
+        spec = None
+
+    interpreter = _python_interpreter()
+    site_dirs = _site_packages(interpreter)
+    if spec is None:
+        spec = importlib.machinery.PathFinder.find_spec("debugpy", site_dirs)
+
+    if spec is not None and spec.submodule_search_locations:
+        return os.path.dirname(list(spec.submodule_search_locations)[0])
+    return _load_cache(interpreter, site_dirs)
+
+
+# The full search, run on a thread so that Blender never waits for its subprocesses.
+_discovery_thread = None
+_discovered = None
+
+
+def start_debugpy_discovery():
+    """Search for debugpy on a thread if find_debugpy() couldn't tell where it is."""
+    global _discovery_thread
+    if _discovery_thread is not None or find_debugpy() is not None:
+        return
+
+    interpreter = _python_interpreter()
+    _discovery_thread = threading.Thread(
+        target=_discover, args=(interpreter, _site_packages(interpreter)),
+        name="DebugpyDiscovery", daemon=True
+    )
+    _discovery_thread.start()
+    timers.register(_apply_discovered, first_interval=0.5, persistent=True)
+
+
+def stop_debugpy_discovery():
+    """Forget a search that is still running, its thread is left to finish on its own."""
+    global _discovery_thread
+    _discovery_thread = None
+    if timers.is_registered(_apply_discovered):
+        timers.unregister(_apply_discovered)
+
+
+def _discover(interpreter, site_dirs):
+    global _discovered
+    _discovered = check_for_debugpy()
+    _save_cache(interpreter, site_dirs, _discovered)
+
+
+def _apply_discovered():
+    """Fill in the preferences once the search is done, on the main thread."""
+    global _discovery_thread
+    if _discovery_thread is None:
+        return None
+    if _discovery_thread.is_alive():
+        return 0.5
+    _discovery_thread = None
+
+    if _discovered in (None, DEBUGPY_NOT_FOUND):
+        return None
+    try:
+        prefs = bpy.context.preferences.addons[__package__].preferences
+    except (AttributeError, KeyError):
+        return None
+    # Keep a location the user set, unless debugpy isn't there.
+    if prefs is not None and not os.path.isdir(os.path.join(prefs.path.rstrip("/"), "debugpy")):
+        prefs.path = _discovered
+    return None
@@ -0,0 +1,89 @@
+"""
+headless.py: Watch scripts and serve the debugger from blender -b.
+
+Without a UI the addon's timers don't fire on their own, main() starts the
+script watcher and the debug server, then runs the timers until stopped
+with Ctrl+C or for the given duration. The scripts' output goes to stdout.
+
+    blender -b scene.blend --python-expr "import importlib, sys; sys.exit(importlib.import_module('blender_vscode_dev.headless').main())" -- my_addon/__init__.py --debug
+
+Use the name of the addon's folder in place of blender_vscode_dev. main()
+returns the exit code, 1 if the watcher or the debug server couldn't start.
+"""
+
+import argparse
+import os
+import sys
+
+import bpy
+
+from . import lazy, timers
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='blender -b --python-expr "...sys.exit(headless.main())" --',
+        description='Watch scripts and serve the debugger without a UI.'
+    )
+    parser.add_argument('scripts', nargs='*', help='Scripts to watch and reload, the first is the main one')
+    parser.add_argument('--backend', choices=('AUTO', 'INOTIFY', 'POLLING'), help='How changes are detected')
+    parser.add_argument('--reload-delay', type=float, help='Seconds to wait for more changes before reloading')
+    parser.add_argument('--debug', action='store_true', help='Start the debug server for VS Code')
+    parser.add_argument('--wait-for-client', action='store_true', help='Wait for VS Code to attach before watching')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    return parser.parse_args(argv)
+
+
+def _enable_addon():
+    """Register the addon if Blender didn't, as with --factory-startup."""
+    if __package__ not in bpy.context.preferences.addons:
+        import addon_utils
+        addon_utils.enable(__package__, default_set=True)
+
+
+def _start_watcher(args):
+    lazy.subsystems['watcher'].load()
+    settings = bpy.context.scene.sw_settings
+    settings.filepath = os.path.abspath(args.scripts[0])
+    settings.targets.clear()
+    for script in args.scripts[1:]:
+        settings.targets.add().filepath = os.path.abspath(script)
+    settings.use_py_console = False
+    if args.backend is not None:
+        settings.backend = args.backend
+    if args.reload_delay is not None:
+        settings.reload_delay = args.reload_delay
+    return 'FINISHED' in bpy.ops.wm.sw_watch_start()
+
+
+def main(argv=None):
+    """Run from blender -b, the arguments are the ones after --. Returns the exit code."""
+    if argv is None:
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    args = parse_args(argv)
+    if not bpy.app.background:
+        print('Code Tools: headless.main() is for blender -b, the UI runs the timers already.')
+        return 1
+    _enable_addon()
+
+    if args.debug:
+        lazy.subsystems['debugger'].load()
+        if 'FINISHED' not in bpy.ops.debug.connect_debugger_vscode(waitForClient=args.wait_for_client):
+            return 1
+    if args.scripts and not _start_watcher(args):
+        return 1
+    if not args.scripts and not args.debug:
+        print('Code Tools: nothing to do, give scripts to watch or --debug.')
+        return 1
+
+    print('Code Tools: running headless, press Ctrl+C to stop.')
+    sys.stdout.flush()
+    try:
+        timers.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.scripts:
+            bpy.context.scene.sw_settings.running = False
+            lazy.subsystems['watcher'].import_module().stop_watcher()
+    return 0
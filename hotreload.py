@@ -0,0 +1,229 @@
+"""
+hotreload.py: Only register again the Blender classes that changed.
+
+Every reload runs the script's register() again, which unregisters and
+registers every operator, panel and property group, changed or not. In hot
+reload mode bpy.utils.register_class is wrapped while the script runs. A
+class that was registered by the previous version of the script is
+compared with its new version: if Blender would see no difference (same
+bl_ attributes, properties and methods), the new method implementations
+are copied onto the registered class and the registration is skipped.
+Only the classes that really changed are registered again.
+"""
+
+import types
+
+import bpy
+
+
+# The reloader of the script being run, None when no reload is running.
+_active = None
+_originals = {}
+
+
+def install():
+    """Wrap the bpy functions that take part in registering classes."""
+    if _originals:
+        return
+
+    _originals['register_class'] = bpy.utils.register_class
+    _originals['unregister_class'] = bpy.utils.unregister_class
+    _originals['PointerProperty'] = bpy.props.PointerProperty
+    _originals['CollectionProperty'] = bpy.props.CollectionProperty
+
+    bpy.utils.register_class = register_class
+    bpy.utils.unregister_class = unregister_class
+    bpy.props.PointerProperty = PointerProperty
+    bpy.props.CollectionProperty = CollectionProperty
+
+
+def uninstall():
+    if not _originals:
+        return
+
+    bpy.utils.register_class = _originals.pop('register_class')
+    bpy.utils.unregister_class = _originals.pop('unregister_class')
+    bpy.props.PointerProperty = _originals.pop('PointerProperty')
+    bpy.props.CollectionProperty = _originals.pop('CollectionProperty')
+
+
+def register_class(cls):
+    if _active is None:
+        return _originals['register_class'](cls)
+    return _active.register(cls)
+
+
+def unregister_class(cls):
+    if _active is None:
+        return _originals['unregister_class'](cls)
+    return _active.unregister(cls)
+
+
+def PointerProperty(**keywords):
+    if _active is not None and 'type' in keywords:
+        keywords['type'] = _active.resolve(keywords['type'])
+    return _originals['PointerProperty'](**keywords)
+
+
+def CollectionProperty(**keywords):
+    if _active is not None and 'type' in keywords:
+        keywords['type'] = _active.resolve(keywords['type'])
+    return _originals['CollectionProperty'](**keywords)
+
+
+def class_key(cls):
+    """Return what identifies a class for Blender: its base type and its bl_idname or name."""
+    base = next((base.__name__ for base in cls.__mro__[1:] if base.__module__ == 'bpy.types'), cls.__mro__[1].__name__)
+    return base, getattr(cls, 'bl_idname', None) or cls.__name__
+
+
+def _deferred_properties(cls):
+    """Return {name: (function, keywords)} of the bpy properties defined on the class."""
+    found = {}
+    for name, value in list(vars(cls).get('__annotations__', {}).items()) + list(vars(cls).items()):
+        if hasattr(value, 'function') and hasattr(value, 'keywords'):
+            found[name] = (value.function, value.keywords)
+        elif isinstance(value, tuple) and len(value) == 2 and callable(value[0]) and isinstance(value[1], dict):
+            found[name] = value  # Blender 2.7x
+    return found
+
+
+def _value_signature(value):
+    if isinstance(value, type):
+        return class_key(value)
+    if isinstance(value, types.FunctionType):
+        # Callbacks (update, get, set...) only change Blender's side when their code does.
+        code = value.__code__
+        return value.__qualname__, code.co_code, repr(code.co_consts)
+    if callable(value):
+        return getattr(value, '__qualname__', getattr(value, '__name__', repr(value)))
+    if isinstance(value, (list, tuple)):
+        return tuple(_value_signature(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _value_signature(item)) for key, item in value.items()))
+    return repr(value)
+
+
+def class_signature(cls):
+    """Return everything Blender sees of a class, which is all but the method bodies."""
+    properties = tuple(sorted(
+        (name, _value_signature(function), _value_signature(keywords))
+        for name, (function, keywords) in _deferred_properties(cls).items()
+    ))
+    attributes = tuple(sorted(
+        (name, _value_signature(value)) for name, value in vars(cls).items() if name.startswith('bl_')
+    ))
+    methods = tuple(sorted(name for name, value in vars(cls).items() if _is_method(value)))
+    bases = tuple(class_key(base) for base in cls.__bases__)
+    return bases, attributes, properties, methods, cls.__doc__
+
+
+def _referenced_types(cls):
+    """Return the classes used as type= by the properties of the class."""
+    return [keywords['type'] for function, keywords in _deferred_properties(cls).values()
+            if isinstance(keywords.get('type'), type)]
+
+
+def _is_method(value):
+    return isinstance(value, (types.FunctionType, classmethod, staticmethod, property))
+
+
+class ClassReloader:
+    """Follow the classes one script registers, from one reload to the next."""
+
+    def __init__(self):
+        self.kept = 0
+        self.reregistered = 0
+        self.registered = 0
+
+        self._previous = {}  # Key -> (registered class, signature) of the last reload.
+        self._current = {}
+        self._aliases = {}  # New class that wasn't registered -> the registered class standing in for it.
+        self._changed = set()  # Keys of the classes registered again during this reload.
+        self._unregistered = set()  # Keys of the previous classes the script unregistered, see unregister().
+
+    def begin(self):
+        global _active
+        self._previous.update(self._current)
+        self._current = {}
+        self._changed = set()
+        self._unregistered = set()
+        self._aliases = {}
+        self.kept = self.reregistered = self.registered = 0
+        _active = self
+
+    def end(self):
+        global _active
+        _active = None
+
+        # The script unregistered these and didn't register them again.
+        for key in self._unregistered:
+            entry = self._previous.pop(key, None)
+            if entry is not None and getattr(entry[0], 'is_registered', True):
+                _originals['unregister_class'](entry[0])
+
+        # Classes the new version didn't register again are still registered.
+        for key, entry in self._previous.items():
+            self._current.setdefault(key, entry)
+        self._previous = {}
+
+        if self.kept or self.reregistered:
+            print('Hot reload: kept %d classes, registered %d again and %d new' % (
+                self.kept, self.reregistered, self.registered))
+
+    def resolve(self, cls):
+        """Return the class registered in place of cls."""
+        return self._aliases.get(cls, cls)
+
+    def register(self, cls):
+        key = class_key(cls)
+
+        # Point the properties to the classes that are actually registered.
+        for function, keywords in _deferred_properties(cls).values():
+            if keywords.get('type') in self._aliases:
+                keywords['type'] = self._aliases[keywords['type']]
+        signature = class_signature(cls)
+
+        entry = self._previous.pop(key, None)
+        self._unregistered.discard(key)
+        if entry is not None and getattr(entry[0], 'is_registered', True):
+            old, old_signature = entry
+            depends_on_changed = any(class_key(ref) in self._changed for ref in _referenced_types(cls))
+            if signature == old_signature and not depends_on_changed:
+                self._swap(old, cls)
+                self._aliases[cls] = old
+                self._current[key] = (old, old_signature)
+                self.kept += 1
+                return None
+
+            _originals['unregister_class'](old)
+            self._changed.add(key)
+            self.reregistered += 1
+        else:
+            self.registered += 1
+
+        result = _originals['register_class'](cls)
+        self._current[key] = (cls, signature)
+        return result
+
+    def unregister(self, cls):
+        key = class_key(cls)
+        entry = self._previous.get(key)
+        if entry is not None and entry[0] is not cls:
+            # The script unregisters the new versions of its classes before registering
+            # them, they never were. The previous class stays registered until register()
+            # compared the new version with it, or until end() if it never comes.
+            self._unregistered.add(key)
+            return None
+
+        self._current.pop(key, None)
+        self._previous.pop(key, None)
+        return _originals['unregister_class'](self._aliases.pop(cls, cls))
+
+    def _swap(self, old, new):
+        """Give the registered class the implementation of its new version."""
+        properties = _deferred_properties(new)
+        for name, value in vars(new).items():
+            if name.startswith('__') or name.startswith('bl_') or name in properties:
+                continue
+            setattr(old, name, value)
@@ -0,0 +1,93 @@
+"""
+importhook.py: Import hook for the modules of the watched package.
+
+While a script is watched, a finder sits at the front of sys.meta_path and
+handles the imports of the watched packages' submodules, loading their code
+from the watcher's CodeCache instead of compiling it again. It also keeps
+the reverse index of which sys.modules entries belong to the watched trees.
+"""
+
+import os
+import sys
+from importlib.abc import MetaPathFinder
+from importlib.machinery import PathFinder, SourceFileLoader
+
+
+class CachedSourceLoader(SourceFileLoader):
+    """Source loader that takes its code objects from a CodeCache."""
+
+    def __init__(self, fullname, path, cache):
+        SourceFileLoader.__init__(self, fullname, path)
+        self.cache = cache
+
+    def get_code(self, fullname):
+        return self.cache.get(self.path)
+
+
+class WatchedPackageFinder(MetaPathFinder):
+    """Find the modules of the watched packages and remember which ones we loaded.
+
+    The names in owned are what has to be purged from sys.modules on reload,
+    so the purge never has to look at the rest of sys.modules.
+    """
+
+    def __init__(self, packages, index, cache):
+        self.packages = dict(packages)  # Package name -> filepath of its target.
+        self.index = index  # Anything with the watched files, the package .paths and target_of().
+        self.cache = cache
+        self.owned = {}  # Names of the modules loaded from the watched files -> filepath of their target.
+
+    def find_spec(self, fullname, path=None, target=None):
+        package, dot, _ = fullname.partition('.')
+        if not dot or package not in self.packages:
+            # Scripts may put their own directories on sys.path and import from them directly.
+            if path is not None or not any(p in sys.path for p in self.index.paths):
+                return None  # Everything else is left to the regular finders.
+
+            spec = PathFinder.find_spec(fullname, path)
+            if spec is None or spec.origin not in self.index:
+                return None
+        else:
+            spec = PathFinder.find_spec(fullname, path)
+            if spec is None or spec.origin not in self.index:
+                return spec
+
+        self.owned[fullname] = self.index.target_of(spec.origin)
+        if isinstance(spec.loader, SourceFileLoader):
+            spec.loader = CachedSourceLoader(fullname, spec.origin, self.cache)
+        return spec
+
+    def adopt(self):
+        """Take over the modules of the watched files that were imported before the hook was installed.
+
+        As when the addon being worked on is enabled in Blender too, possibly
+        through a symlink. Scans sys.modules once, needs the index.
+        """
+        for name, module in list(sys.modules.items()):
+            filepath = getattr(module, '__file__', None)
+            if not isinstance(filepath, str) or name in self.owned:
+                continue
+            if filepath not in self.index:
+                filepath = os.path.realpath(filepath)
+                if filepath not in self.index:
+                    continue
+            self.owned[name] = self.index.target_of(filepath)
+
+    def forget(self, names=None, target=None):
+        """Remove modules we loaded from sys.modules.
+
+        Either the given modules, the modules of the given target or all of them.
+        """
+        if names is None:
+            names = [name for name, owner in self.owned.items() if target is None or owner == target]
+        for name in list(names):
+            sys.modules.pop(name, None)
+            self.owned.pop(name, None)
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
@@ -0,0 +1,196 @@
+"""
+lazy.py: Register the addon's subsystems the first time they are used.
+
+Importing the script watcher or the debugger pulls in most of the addon and
+registering them adds scene properties, handlers and timers. At startup only
+stubs are registered instead: a panel with the bl_idname of the real one
+and operators with the bl_idnames of the entry points. Drawing a stub panel
+or running a stub operator loads the subsystem from a timer, since classes
+can't be registered while drawing or while the operator runs. The stubs are
+swapped for the real classes and the operator is run again.
+
+The time every step of the registration takes is kept in startup_times.
+"""
+
+import collections
+import contextlib
+import importlib
+import time
+
+import bpy
+from bpy.app.handlers import persistent
+
+from . import timers
+from .redraw import drawn, mark_dirty
+from .utils import make_annotations
+
+
+# Step -> seconds, in the order they ran.
+startup_times = collections.OrderedDict()
+
+# Name -> Subsystem
+subsystems = collections.OrderedDict()
+
+
+@contextlib.contextmanager
+def startup_step(name):
+    """Time a step of the registration."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_times[name] = startup_times.get(name, 0.0) + time.perf_counter() - start
+
+
+def startup_report(steps=None):
+    """Return the timed steps as one line."""
+    steps = list(startup_times if steps is None else steps)
+    return ', '.join('%s %.1f ms' % (step, startup_times[step] * 1000) for step in steps)
+
+
+class Subsystem:
+    """A part of the addon that is only imported and registered when first needed.
+
+    module is the submodule, with register and unregister functions of the
+    given names. panel is (bl_idname, bl_label) of its panel in the text
+    editor, operators are (bl_idname, bl_label, properties) of the
+    operators that can be run without the panel. scene_flag is (property
+    group, boolean) of a scene setting: when a file is loaded with it set,
+    the subsystem is loaded and the module's load_post handler is run.
+    """
+
+    def __init__(self, name, module, register, unregister, panel, operators=(), scene_flag=None, load_post=None):
+        self.name = name
+        self.module = module
+        self.register_name = register
+        self.unregister_name = unregister
+        self.scene_flag = scene_flag
+        self.load_post = load_post
+
+        self.loaded = False
+        self._pending = None  # Functions to call once loaded, None if no load is queued.
+        self._stubs = [self._panel_stub(*panel)] + [self._operator_stub(*operator) for operator in operators]
+        subsystems[name] = self
+
+    def register(self):
+        with startup_step(self.name + ' stubs'):
+            for cls in self._stubs:
+                bpy.utils.register_class(cls)
+
+    def unregister(self):
+        if timers.is_registered(self._load_queued):
+            timers.unregister(self._load_queued)
+        self._pending = None
+
+        if self.loaded:
+            getattr(self.import_module(), self.unregister_name)()
+            self.loaded = False
+        else:
+            for cls in reversed(self._stubs):
+                bpy.utils.unregister_class(cls)
+
+    def import_module(self):
+        return importlib.import_module(self.module, __package__)
+
+    def load(self):
+        """Import and register the subsystem in place of its stubs."""
+        if self.loaded:
+            return self.import_module()
+
+        with startup_step(self.name + ' import'):
+            module = self.import_module()
+        with startup_step(self.name + ' register'):
+            for cls in reversed(self._stubs):
+                bpy.utils.unregister_class(cls)
+            getattr(module, self.register_name)()
+        self.loaded = True
+
+        print('Code Tools: loaded the %s (%s)' % (
+            self.name, startup_report((self.name + ' import', self.name + ' register'))))
+        mark_dirty(self.name)
+        return module
+
+    def load_later(self, then=None):
+        """Load from a timer, then call then(module)."""
+        if self._pending is None:
+            self._pending = []
+            timers.register(self._load_queued, first_interval=0.0)
+        if then is not None:
+            self._pending.append(then)
+
+    def _load_queued(self):
+        pending, self._pending = self._pending or [], None
+        module = self.load()
+        for then in pending:
+            then(module)
+        return None
+
+    def on_load_post(self):
+        """Load the subsystem if the file that was just loaded wants it, then run its handler."""
+        if self.loaded or self.scene_flag is None:
+            return
+        group, flag = self.scene_flag
+        for scene in bpy.data.scenes:
+            settings = scene.get(group)
+            if settings is not None and settings.get(flag):
+                self.load_later(lambda module: getattr(module, self.load_post)(None))
+                return
+
+    def _panel_stub(self, idname, label):
+        subsystem = self
+
+        class Panel(bpy.types.Panel):
+            bl_label = label
+            bl_idname = idname
+            bl_space_type = 'TEXT_EDITOR'
+            bl_region_type = 'UI'
+            bl_category = "Code Tools"
+
+            def draw(self, context):
+                drawn(subsystem.name, context)
+                self.layout.label(text='Loading...', icon='INFO')
+                subsystem.load_later()
+
+        Panel.__name__ = idname + '_stub'
+        return Panel
+
+    def _operator_stub(self, idname, label, properties=None):
+        subsystem = self
+        properties = properties or {}
+
+        class Operator(bpy.types.Operator):
+            bl_idname = idname
+            bl_label = label
+
+            def execute(self, context):
+                keywords = dict((name, getattr(self, name)) for name in properties)
+                subsystem.load_later(lambda module: _run_operator(idname, keywords))
+                return {'FINISHED'}
+
+        for name, prop in properties.items():
+            setattr(Operator, name, prop)
+        Operator.__name__ = idname.upper().replace('.', '_OT_') + '_stub'
+        return make_annotations(Operator)
+
+
+def _run_operator(idname, keywords):
+    category, name = idname.split('.')
+    getattr(getattr(bpy.ops, category), name)(**keywords)
+
+
+@persistent
+def load_post(dummy):
+    for subsystem in subsystems.values():
+        subsystem.on_load_post()
+
+
+def register():
+    bpy.app.handlers.load_post.append(load_post)
+    for subsystem in subsystems.values():
+        subsystem.register()
+
+
+def unregister():
+    for subsystem in reversed(subsystems.values()):
+        subsystem.unregister()
+    bpy.app.handlers.load_post.remove(load_post)
@@ -0,0 +1,132 @@
+"""
+metrics.py: Timings of the script watcher's reload cycles.
+
+Every cycle records how long each of its phases took, from walking the
+tree on the watcher thread to the output reaching the consoles, and how
+long it took from the first detected change until the scripts were run.
+The most recent cycles are kept in memory and can be exported as JSON lines.
+"""
+
+import collections
+import json
+import math
+import time
+
+
+PHASES = ('walk', 'compile', 'purge', 'exec', 'output')
+
+
+class ReloadRecord:
+    """Timings of one reload cycle, in seconds."""
+
+    def __init__(self, burst, detected, events=0, phases=None):
+        self.burst = burst
+        self.time = time.time()  # Wall clock, for the export.
+        self.detected = detected  # time.monotonic() of the first change of the cycle.
+        self.ready = None  # time.monotonic() when the last script of the cycle finished running.
+        self.events = events
+        self.targets = []  # Module names of the reloaded scripts.
+        self.versions = {}  # Module name -> bl_info version, when the script has one.
+        self.ok = True
+
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        if phases:
+            self.phases.update(phases)
+
+    @property
+    def latency(self):
+        """Seconds from detection to the scripts being run, None if not done yet."""
+        if self.ready is None or self.detected is None:
+            return None
+        return self.ready - self.detected
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def phase(self, name):
+        """Return a context manager adding the time spent in it to the given phase."""
+        return _PhaseTimer(self, name)
+
+    def as_dict(self):
+        return {
+            'time': self.time,
+            'targets': self.targets,
+            'versions': self.versions,
+            'events': self.events,
+            'ok': self.ok,
+            'latency': self.latency,
+            'phases': self.phases,
+        }
+
+    def summary(self):
+        """Return a one line description for the UI."""
+        latency = self.latency
+        text = '%s: %s' % (', '.join(self.targets) or '?', '-' if latency is None else _ms(latency))
+        return text + ' (%s)' % ', '.join('%s %s' % (name, _ms(self.phases[name])) for name in PHASES)
+
+
+class _PhaseTimer:
+    __slots__ = ('record', 'name', 'start')
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.record.add(self.name, time.perf_counter() - self.start)
+
+
+class ReloadMetrics:
+    """The most recent reload cycles."""
+
+    def __init__(self, maxlen=200):
+        self.records = collections.deque(maxlen=maxlen)
+
+    def cycle(self, burst, detected, events=0, phases=None):
+        """Return the record of the given cycle, starting a new one if needed.
+
+        A cycle reloading several scripts is one record.
+        """
+        if self.records and self.records[-1].burst == burst:
+            return self.records[-1]
+        record = ReloadRecord(burst, detected, events, phases)
+        self.records.append(record)
+        return record
+
+    def recent(self, count=5):
+        """Return the last count records, most recent first."""
+        return list(self.records)[:-count - 1:-1]
+
+    def percentiles(self, phase=None, percents=(50, 90, 99)):
+        """Return {percent: seconds} of the latency, or of a phase, over the kept records."""
+        if phase is None:
+            values = [record.latency for record in self.records if record.latency is not None]
+        else:
+            values = [record.phases[phase] for record in self.records]
+        if not values:
+            return {}
+
+        values.sort()
+        # Nearest rank, so the result is always a time that was measured.
+        return dict((p, values[max(0, math.ceil(p / 100.0 * len(values)) - 1)]) for p in percents)
+
+    def export(self, filepath):
+        """Append the records to a JSON lines file, return how many were written."""
+        with open(filepath, 'a', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(record.as_dict()) + '\n')
+        return len(self.records)
+
+    def clear(self):
+        self.records.clear()
+
+
+def _ms(seconds):
+    return '%.1f ms' % (seconds * 1000.0)
+
+
+reload_metrics = ReloadMetrics()
@@ -0,0 +1,434 @@
+"""
+notify.py: Change detection backends for the script watcher.
+
+A backend is told which files to watch and queues a ChangeEvent whenever one
+of them changes. The watcher drains that queue when it is woken up, so an idle
+watcher costs nothing.
+"""
+
+import collections
+import ctypes
+import ctypes.util
+import errno
+import heapq
+import os
+import random
+import select
+import struct
+import sys
+import threading
+import time
+
+
+ChangeEvent = collections.namedtuple('ChangeEvent', 'path kind time')
+
+# Event kinds.
+MODIFIED = 'MODIFIED'
+CREATED = 'CREATED'
+DELETED = 'DELETED'
+RESCAN = 'RESCAN'  # Events were lost, everything should be considered changed.
+
+
+class ChangeBackend:
+    """Base class for the change detection backends."""
+    name = 'NONE'
+
+    wakeup = None  # Optional threading.Event set whenever a change is queued.
+
+    def __init__(self):
+        self._events = collections.deque()
+        self._files = frozenset()
+        self._dirs = frozenset()
+
+    def watch(self, files, dirs=()):
+        """Replace the set of watched files and directories.
+
+        Changes to any entry of a watched directory are reported, which is
+        how new files are found.
+        """
+        self._files = frozenset(files)
+        self._dirs = frozenset(dirs)
+
+    def push(self, path, kind=MODIFIED):
+        """Queue a change event, safe to call from any thread."""
+        self._events.append(ChangeEvent(path, kind, time.monotonic()))
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def poll(self):
+        """Look for changes, called before draining."""
+
+    def poll_delay(self):
+        """Return the seconds until poll() should run again, None if it needn't."""
+        return None
+
+    def latency(self):
+        """Return {tier: (median, max, count)} of the seconds changes took to be detected."""
+        return {}
+
+    def drain(self):
+        """Return the queued events, keeping only the latest one per path."""
+        self.poll()
+        if not self._events:
+            return []
+
+        latest = collections.OrderedDict()
+        while True:
+            try:
+                event = self._events.popleft()
+            except IndexError:
+                break
+            latest.pop(event.path, None)
+            latest[event.path] = event
+        return list(latest.values())
+
+    def close(self):
+        """Stop watching and release any resources."""
+        self._files = frozenset()
+        self._dirs = frozenset()
+
+
+# Priority tiers of the polling backend.
+HOT = 'HOT'  # Changed in the last minute, polled on every tick.
+WARM = 'WARM'  # Directories, and files changed in the last ten minutes.
+COLD = 'COLD'  # Everything else, polled a slice at a time.
+TIERS = (HOT, WARM, COLD)
+
+
+class PollingBackend(ChangeBackend):
+    """Detect changes by comparing the modification time of the files.
+
+    Stat'ing every file on every tick costs more the larger the tree, so
+    the files are polled by priority instead. Hot files, the ones being
+    edited, are polled every tick so a save is seen within interval
+    seconds. Warm and cold entries are polled when they are due, at most
+    max_stats per tick, and the longer nothing changes the further apart
+    their polls get.
+    """
+    name = 'POLLING'
+
+    interval = 0.05  # Seconds between ticks while there are hot files.
+    max_stats = 200  # Warm and cold entries polled per tick at most.
+    hot_time = 60.0  # Seconds a changed file stays hot, then warm.
+    warm_time = 600.0  # Seconds a file stays warm, then cold.
+    max_hot = 64
+
+    warm_period = 0.5  # Seconds between the polls of a warm entry while active.
+    cold_period = 1.0
+    idle_step = 10.0  # The periods double every idle_step seconds without changes...
+    max_backoff = 4  # ...up to this factor.
+
+    def __init__(self):
+        ChangeBackend.__init__(self)
+        self._times = {}
+        self._hot = {}  # Path -> monotonic time it cools down to warm.
+        self._warm = {}  # Path -> monotonic time it cools down to cold.
+        self._queue = []  # Heap of (due, path) of the warm and cold entries.
+        self._next_tick = 0.0
+        self._last_change = time.monotonic()
+        self._latency = dict((tier, collections.deque(maxlen=100)) for tier in TIERS)
+
+    def watch(self, files, dirs=()):
+        ChangeBackend.watch(self, files, dirs)
+        now = time.monotonic()
+        first = not self._times
+        times = {}
+        queue = []
+        for path in self._files | self._dirs:
+            if path in self._times:
+                times[path] = self._times[path]
+            else:
+                times[path] = _mtime(path)
+                if not first and path in self._files:
+                    # A new file is likely to be edited next.
+                    self._hot[path] = now + self.hot_time
+            if path not in self._hot:
+                queue.append((now + self._period(path, now) * random.random(), path))
+        heapq.heapify(queue)
+        self._times = times
+        self._queue = queue
+        for path in list(self._hot):
+            if path not in times:
+                del self._hot[path]
+
+    def poll(self):
+        now = time.monotonic()
+        if now < self._next_tick:
+            return
+
+        for path, until in list(self._hot.items()):
+            self._check(path, HOT)
+            if until <= now and path in self._hot:
+                del self._hot[path]
+                self._warm[path] = now + self.warm_time
+                heapq.heappush(self._queue, (now + self._period(path, now), path))
+
+        stats = 0
+        while self._queue and self._queue[0][0] <= now and stats < self.max_stats:
+            due, path = heapq.heappop(self._queue)
+            if path not in self._times or path in self._hot:
+                continue  # No longer watched, or already polled as a hot file.
+            stats += 1
+            self._check(path, WARM if path in self._dirs or path in self._warm else COLD)
+            if path in self._hot:
+                continue  # It changed, it is polled as a hot file from now on.
+            if self._warm.get(path, now) < now:
+                del self._warm[path]
+            heapq.heappush(self._queue, (now + self._period(path, now), path))
+
+        self._next_tick = now + self.interval
+
+    def poll_delay(self):
+        if self._hot or not self._queue:
+            return self.interval
+        return max(self.interval, self._queue[0][0] - time.monotonic())
+
+    def latency(self):
+        result = {}
+        for tier, latencies in self._latency.items():
+            if latencies:
+                latencies = sorted(latencies)
+                result[tier] = (latencies[len(latencies) // 2], latencies[-1], len(latencies))
+        return result
+
+    def _check(self, path, tier):
+        """Stat a path, queue an event and make it hot if it changed."""
+        last_time = self._times[path]
+        cur_time = _mtime(path)
+        if cur_time == last_time:
+            return False
+
+        self._times[path] = cur_time
+        self._last_change = now = time.monotonic()
+        if cur_time is not None:
+            # How long the change went unnoticed, as far as the file system clock tells.
+            self._latency[tier].append(max(0.0, time.time() - cur_time))
+        self.push(path, DELETED if cur_time is None else MODIFIED)
+
+        if path in self._files and cur_time is not None:
+            self._warm.pop(path, None)
+            self._hot[path] = now + self.hot_time
+            if len(self._hot) > self.max_hot:
+                coolest = min(self._hot, key=self._hot.get)
+                self._hot[coolest] = now  # Demoted on the next tick.
+        return True
+
+    def _period(self, path, now):
+        """Return the seconds until a warm or cold entry is polled again."""
+        idle = now - self._last_change
+        backoff = min(self.max_backoff, 2 ** int(idle / self.idle_step))
+        if path in self._dirs or path in self._warm:
+            return self.warm_period * backoff
+        return self.cold_period * backoff
+
+
+# Constants from <sys/inotify.h>.
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyBackend(ChangeBackend):
+    """Receive change events from the linux kernel on a background thread.
+
+    Watches are placed on the directories of the watched files, which also
+    catches editors that save by writing a new file and renaming it. The
+    directories the kernel refuses more watches for, once max_user_watches
+    is reached, are polled instead.
+    """
+    name = 'INOTIFY'
+
+    _libc = None
+
+    def __init__(self):
+        ChangeBackend.__init__(self)
+        libc = self.load_libc()
+
+        self._fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self._lock = threading.Lock()
+        self._watches = {}  # Directory -> watch descriptor.
+        self._wds = {}  # Watch descriptor -> directory.
+        self._fallback = None  # PollingBackend of the directories that couldn't be watched.
+        self._wake_r, self._wake_w = os.pipe()
+
+        self._thread = threading.Thread(target=self._run, name='ScriptWatcherInotify', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def load_libc(cls):
+        """Return libc with the inotify functions, raise OSError if they are missing."""
+        if cls._libc is None:
+            if not sys.platform.startswith('linux'):
+                raise OSError('inotify is only available on linux')
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            try:
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            except AttributeError:
+                raise OSError('libc has no inotify support')
+            cls._libc = libc
+        return cls._libc
+
+    def watch(self, files, dirs=()):
+        ChangeBackend.watch(self, files, dirs)
+        dirs = self._dirs.union(os.path.dirname(path) for path in self._files)
+
+        with self._lock:
+            for dirname in set(self._watches) - dirs:
+                self._libc.inotify_rm_watch(self._fd, self._watches.pop(dirname))
+
+            unwatched = set()
+            for dirname in dirs - set(self._watches):
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirname), WATCH_MASK)
+                if wd < 0:
+                    if ctypes.get_errno() in (errno.ENOSPC, errno.ENOMEM):
+                        unwatched.add(dirname)
+                    # Otherwise the directory may have been removed, the next event will tell.
+                    continue
+                self._watches[dirname] = wd
+                self._wds[wd] = dirname
+
+        self._poll_unwatched(unwatched)
+
+    def _poll_unwatched(self, dirs):
+        """Poll the directories inotify couldn't watch, and their watched files."""
+        if not dirs:
+            if self._fallback is not None:
+                self._fallback.close()
+                self._fallback = None
+            return
+        if self._fallback is None:
+            print('Script Watcher: out of inotify watches, polling %d directories instead. '
+                  'Raise fs.inotify.max_user_watches to watch them all.' % len(dirs))
+            self._fallback = PollingBackend()
+            self._fallback.push = self.push  # Its events go to this backend's queue.
+        self._fallback.watch([path for path in self._files if os.path.dirname(path) in dirs], dirs)
+
+    def poll(self):
+        if self._fallback is not None:
+            self._fallback.poll()
+
+    def poll_delay(self):
+        if self._fallback is None:
+            return None
+        return self._fallback.poll_delay()
+
+    def latency(self):
+        if self._fallback is None:
+            return {}
+        return self._fallback.latency()
+
+    def _run(self):
+        while True:
+            try:
+                readable, _, _ = select.select([self._fd, self._wake_r], [], [])
+            except (OSError, ValueError):
+                return
+            if self._wake_r in readable:
+                return
+
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            self._parse(data)
+
+    def _parse(self, data):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.push(None, RESCAN)
+                continue
+
+            with self._lock:
+                dirname = self._wds.get(wd)
+                if mask & IN_IGNORED:
+                    # The watch was removed, either by us or because the directory is gone.
+                    self._wds.pop(wd, None)
+                    if self._watches.get(dirname) == wd:
+                        del self._watches[dirname]
+            if dirname is None:
+                continue
+
+            if not name:
+                # The directory itself went away.
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    self.push(dirname, DELETED)
+                continue
+
+            path = os.path.join(dirname, os.fsdecode(name))
+            if path not in self._files and dirname not in self._dirs:
+                continue
+
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self.push(path, DELETED)
+            elif mask & IN_CREATE:
+                self.push(path, CREATED)
+            else:
+                self.push(path, MODIFIED)
+
+    def close(self):
+        ChangeBackend.close(self)
+        if self._fallback is not None:
+            self._fallback.close()
+            self._fallback = None
+        if self._fd < 0:
+            return
+        os.write(self._wake_w, b'x')
+        self._thread.join(1.0)
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            os.close(fd)
+        self._fd = -1
+        self._watches.clear()
+        self._wds.clear()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+BACKENDS = {
+    PollingBackend.name: PollingBackend,
+    InotifyBackend.name: InotifyBackend,
+}
+
+
+def create_backend(kind='AUTO'):
+    """Create the requested backend, falling back to polling if it is not available."""
+    if kind == 'AUTO':
+        kind = InotifyBackend.name if sys.platform.startswith('linux') else PollingBackend.name
+
+    try:
+        return BACKENDS[kind]()
+    except OSError as e:
+        print('Script Watcher: %s change detection unavailable (%s), using polling.' % (kind.lower(), e))
+        return PollingBackend()
@@ -0,0 +1,147 @@
+"""
+pathfilter.py: Decide which files of the package trees are watched.
+
+Include and exclude globs, and optionally the patterns of the .gitignore
+files above the scripts, are compiled once into a few regular expressions.
+The tree index asks the filter about every entry it lists, an excluded
+directory is never walked.
+
+The globs follow the .gitignore rules, roughly: a pattern without a slash
+matches the name of an entry at any depth, one with a slash matches the
+path relative to the script's directory (or to the .gitignore), a trailing
+slash only matches directories and a leading ! keeps entries back.
+"""
+
+import fnmatch
+import os
+import re
+
+
+DEFAULT_INCLUDE = '*'
+DEFAULT_EXCLUDE = ', '.join((
+    '__pycache__/', '.git/', '.sw_profiles/', '*.pyc', '*.pyo', '*.blend', '*.blend1',
+    '*.png', '*.jpg', '*.jpeg', '*.exr', '*.hdr', '*.tif', '*.tiff', '*.psd', '*.zip',
+))
+
+
+def split_globs(text):
+    """Return the globs of a comma separated list."""
+    return [glob.strip() for glob in text.split(',') if glob.strip()]
+
+
+class _Patterns:
+    """Globs compiled into one regex for names and one for absolute paths, for files and for directories."""
+
+    def __init__(self):
+        self._parts = {}  # (is_dir, on_path) -> [regex]
+        self._compiled = {}
+
+    def __bool__(self):
+        return bool(self._parts)
+
+    def add(self, pattern, base):
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/') if dir_only else pattern
+        if not pattern:
+            return
+
+        if '/' in pattern:
+            regex = fnmatch.translate(os.path.join(base, pattern.lstrip('/')))
+            on_path = True
+        else:
+            regex = fnmatch.translate(pattern)
+            on_path = False
+
+        for is_dir in (True,) if dir_only else (False, True):
+            self._parts.setdefault((is_dir, on_path), []).append(regex)
+
+    def compile(self):
+        self._compiled = dict(
+            (key, re.compile('|'.join('(?:%s)' % part for part in parts)).match)
+            for key, parts in self._parts.items()
+        )
+
+    def match(self, path, name, is_dir):
+        match = self._compiled.get((is_dir, False))
+        if match is not None and match(name):
+            return True
+        match = self._compiled.get((is_dir, True))
+        return match is not None and match(path) is not None
+
+
+class PathFilter:
+    """Tell which entries of the watched trees are excluded.
+
+    roots are the directories of the watched scripts, the relative globs
+    are relative to each of them.
+    """
+
+    def __init__(self, roots=(), include=DEFAULT_INCLUDE, exclude=DEFAULT_EXCLUDE, use_gitignore=True):
+        self._include = _Patterns()
+        self._exclude = _Patterns()
+        self._keep = _Patterns()  # The ! patterns.
+        self.gitignores = []
+
+        roots = list(dict.fromkeys(os.path.abspath(root) for root in roots))
+        for root in roots:
+            for pattern in split_globs(include):
+                if pattern != '*':
+                    self._include.add(pattern, root)
+            for pattern in split_globs(exclude):
+                self._add_exclude(pattern, root)
+
+        if use_gitignore:
+            for path in _find_gitignores(roots):
+                self.gitignores.append(path)
+                for pattern in _read_gitignore(path):
+                    self._add_exclude(pattern, os.path.dirname(path))
+
+        self._include.compile()
+        self._exclude.compile()
+        self._keep.compile()
+
+    def _add_exclude(self, pattern, base):
+        if pattern.startswith('!'):
+            self._keep.add(pattern[1:], base)
+        else:
+            self._exclude.add(pattern, base)
+
+    def excluded(self, path, is_dir=False):
+        """Return True if the file or directory shouldn't be watched."""
+        name = os.path.basename(path)
+        if self._exclude.match(path, name, is_dir) and not self._keep.match(path, name, is_dir):
+            return True
+        if self._include and not is_dir:
+            return not self._include.match(path, name, False)
+        return False
+
+
+def _find_gitignores(roots):
+    """Return the .gitignore files of the roots and of their parents in the same repository.
+
+    Outside of a repository only the .gitignore of the root itself is used.
+    """
+    found = []
+    for root in roots:
+        chain = []
+        directory = root
+        while True:
+            chain.append(os.path.join(directory, '.gitignore'))
+            if os.path.exists(os.path.join(directory, '.git')):
+                break
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                chain = chain[:1]  # Not in a repository.
+                break
+            directory = parent
+        found.extend(path for path in reversed(chain) if os.path.isfile(path) and path not in found)
+    return found
+
+
+def _read_gitignore(path):
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
@@ -0,0 +1,227 @@
+"""
+ports.py: Give every Blender instance on the host its own debug server port.
+
+The ports in use are recorded in a registry shared by all the instances,
+a JSON file in the temporary directory, only read and written while holding
+a lock on it. An instance picks the first port of a range that no live
+instance recorded and that it can listen on. debugpy can't stop listening,
+so an entry stays until its process exits. The registry also keeps the
+attach configurations of a VS Code launch.json up to date, one per
+instance. When an instance only traces the watched scripts, its
+configuration only steps through their directories too.
+"""
+
+import contextlib
+import json
+import os
+import re
+import socket
+import sys
+import tempfile
+import time
+
+import bpy
+
+
+REGISTRY_PATH = os.path.join(tempfile.gettempdir(), 'blender_vscode_dev', 'debug_ports.json')
+
+# The launch.json configurations made from the registry have names starting with this.
+LAUNCH_NAME = 'Blender attach'
+
+
+@contextlib.contextmanager
+def _locked():
+    """Hold an exclusive lock on the registry, waiting for other instances.
+
+    Not reentrant, even within one process.
+    """
+    path = REGISTRY_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'a+b') as f:
+        if sys.platform == 'win32':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after 10 seconds.
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _load():
+    """Return {pid: entry} of the live instances, the lock must be held."""
+    try:
+        with open(REGISTRY_PATH, encoding='utf-8') as f:
+            registry = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(registry, dict):
+        return {}
+    return dict((pid, entry) for pid, entry in registry.items() if _pid_alive(int(pid)))
+
+
+def _save(registry):
+    temp = '%s.%d.tmp' % (REGISTRY_PATH, os.getpid())
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, indent=2, sort_keys=True)
+    os.replace(temp, REGISTRY_PATH)
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if sys.platform == 'win32':
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return code.value == STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Someone else's process.
+    return True
+
+
+def _port_free(port, host='localhost'):
+    """Return True if nothing listens on the port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+
+def _entry(port):
+    return {
+        'port': port,
+        'pid': os.getpid(),
+        'blend': bpy.data.filepath,
+        'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'roots': [],
+    }
+
+
+def listen_on_free_port(listen, first, last):
+    """Call listen(port) with the first free port between first and last, record and return it.
+
+    The registry stays locked until listen() returned, so two instances
+    can't pick the same port. listen() raising OSError or RuntimeError means
+    the port was taken after all, the next one is tried.
+    """
+    with _locked():
+        registry = _load()
+        recorded = set(entry['port'] for pid, entry in registry.items() if int(pid) != os.getpid())
+        errors = []
+        for port in range(first, last + 1):
+            if port in recorded or not _port_free(port):
+                continue
+            try:
+                listen(port)
+            except (OSError, RuntimeError) as e:
+                errors.append('%d: %s' % (port, e))
+                continue
+            registry[str(os.getpid())] = _entry(port)
+            _save(registry)
+            return port
+
+    message = 'No free port between %d and %d' % (first, last)
+    if errors:
+        message += ' (%s)' % '; '.join(errors)
+    raise RuntimeError(message)
+
+
+def record(port):
+    """Record the port this instance listens on, when it wasn't picked by listen_on_free_port()."""
+    with _locked():
+        registry = _load()
+        registry[str(os.getpid())] = _entry(port)
+        _save(registry)
+
+
+def set_roots(roots):
+    """Record the directories the debugger of this instance is scoped to, none to debug everything."""
+    with _locked():
+        registry = _load()
+        entry = registry.get(str(os.getpid()))
+        if entry is None:
+            return
+        entry['roots'] = list(roots)
+        _save(registry)
+
+
+def _read_jsonc(text):
+    """Parse JSON with the comments and trailing commas VS Code allows."""
+    text = re.sub(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', lambda m: m.group(1) or '', text, flags=re.S)
+    text = re.sub(r'("(?:\\.|[^"\\])*")|,(\s*[}\]])', lambda m: m.group(1) or m.group(2), text)
+    return json.loads(text)
+
+
+def launch_configuration(entry):
+    name = os.path.basename(entry['blend']) or 'unsaved'
+    configuration = {
+        'name': '%s: %s (port %d, pid %d)' % (LAUNCH_NAME, name, entry['port'], entry['pid']),
+        'type': 'debugpy',
+        'request': 'attach',
+        'connect': {'host': 'localhost', 'port': entry['port']},
+    }
+    roots = entry.get('roots')
+    if roots:
+        # Step through the watched directories only, the first rule that matches applies.
+        configuration['justMyCode'] = True
+        configuration['rules'] = [{'path': os.path.join(root, '**'), 'include': True} for root in roots]
+        configuration['rules'].append({'path': '**', 'include': False})
+    return configuration
+
+
+def update_launch_json(path):
+    """Replace the attach configurations of path with one per live instance.
+
+    The other configurations are kept, comments are not. Returns False if
+    the file couldn't be parsed and was left alone.
+    """
+    # Under the registry's lock, the instances share launch.json files too.
+    with _locked():
+        try:
+            with open(path, encoding='utf-8') as f:
+                launch = _read_jsonc(f.read())
+        except FileNotFoundError:
+            launch = {'version': '0.2.0', 'configurations': []}
+        except (OSError, ValueError) as e:
+            print('Not updating %s: %s' % (path, e))
+            return False
+
+        configurations = [
+            configuration for configuration in launch.get('configurations', [])
+            if not str(configuration.get('name', '')).startswith(LAUNCH_NAME)
+        ]
+        entries = sorted(_load().values(), key=lambda entry: entry['port'])
+        configurations.extend(launch_configuration(entry) for entry in entries)
+        launch['configurations'] = configurations
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(launch, f, indent=4)
+            f.write('\n')
+    return True
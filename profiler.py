@@ -0,0 +1,171 @@
+"""
+profiler.py: Profile what a reload runs.
+
+Profiling is opt in, for the next reload only. The watched script's exec
+either runs under cProfile, or is only sampled from a side thread, which
+costs far less but only sees where the main thread is every few
+milliseconds. Both write a pstats file and a collapsed-stack file, the
+input of flame graph tools, to a .sw_profiles directory next to the script.
+The watcher doesn't look into that directory, so writing there doesn't
+trigger a reload.
+"""
+
+import cProfile
+import collections
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+PROFILE_DIR = '.sw_profiles'
+
+# hotspots are (label, seconds) of the functions with the most own time.
+ProfileResult = collections.namedtuple('ProfileResult', 'name mode stats_path collapsed_path hotspots')
+
+# The last profile of every script, by module name.
+profile_results = collections.OrderedDict()
+
+
+class StackSampler:
+    """Sample the stack of a thread from a side thread.
+
+    Only the frames below the one that started the sampler are kept, so the
+    stacks start at the profiled code.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.counts = collections.Counter()  # Stack, root first -> number of samples.
+        self.times = collections.Counter()  # Stack -> seconds.
+
+        self._ident = None
+        self._stop_frame = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self, frame):
+        """Start sampling the current thread below the given frame."""
+        self._ident = threading.get_ident()
+        self._stop_frame = frame
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='ScriptWatcherSampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+        self._stop_frame = None
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stopping.wait(self.interval):
+            now = time.perf_counter()
+            frame = sys._current_frames().get(self._ident)
+            if frame is not None:
+                self._add(frame, now - last)
+            last = now
+
+    def _add(self, frame, seconds):
+        stack = []
+        while frame is not self._stop_frame:
+            if frame is None:
+                return  # Not inside the profiled code.
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+
+        if stack:
+            stack = tuple(reversed(stack))
+            self.counts[stack] += 1
+            self.times[stack] += seconds
+
+    def collapsed(self):
+        """Return the samples as collapsed stacks, one 'root;...;leaf count' per line."""
+        return ''.join(
+            '%s %d\n' % (';'.join(_label(func) for func in stack), count)
+            for stack, count in sorted(self.counts.items())
+        )
+
+    def create_stats(self):
+        """Turn the samples into the stats of a profile, so pstats can read them."""
+        stats = {}
+        for stack, seconds in self.times.items():
+            count = self.counts[stack]
+            seen = set()
+            for i, func in enumerate(stack):
+                if func in seen:
+                    continue  # Recursion, inclusive time only counts once.
+                seen.add(func)
+
+                own = seconds if i == len(stack) - 1 else 0.0
+                cc, nc, tt, ct, callers = stats.get(func, (0, 0, 0.0, 0.0, {}))
+                stats[func] = (cc + count, nc + count, tt + own, ct + seconds, callers)
+                if i:
+                    caller = callers.get(stack[i - 1], (0, 0, 0.0, 0.0))
+                    callers[stack[i - 1]] = (caller[0] + count, caller[1] + count, caller[2] + own, caller[3] + seconds)
+        self.stats = stats
+
+
+class ExecProfiler:
+    """Profile the code run between start() and stop(), then save() the result."""
+
+    def __init__(self, mode, directory, name):
+        self.mode = mode  # 'CPROFILE' or 'SAMPLING'
+        self.directory = directory
+        self.name = name
+        self.ran = False
+
+        self._sampler = StackSampler()
+        self._profile = cProfile.Profile() if mode == 'CPROFILE' else None
+
+    def start(self):
+        # The caller's frame is where the profiled stacks stop.
+        self._sampler.start(sys._getframe(1))
+        if self._profile is not None:
+            self._profile.enable()
+        self.ran = True
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        self._sampler.stop()
+
+    def save(self):
+        """Write the pstats and collapsed-stack files, return a ProfileResult."""
+        directory = os.path.join(self.directory, PROFILE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        now = time.time()
+        stamp = '%s-%03d' % (time.strftime('%Y%m%d-%H%M%S', time.localtime(now)), int(now * 1000) % 1000)
+        base = os.path.join(directory, '%s-%s' % (self.name, stamp))
+
+        stats_path = base + '.prof'
+        try:
+            stats = pstats.Stats(self._profile or self._sampler)
+        except TypeError:
+            stats = None  # Nothing was recorded, the script ran too fast for the sampler.
+            stats_path = None
+        else:
+            stats.dump_stats(stats_path)
+
+        collapsed_path = base + '.collapsed'
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            f.write(self._sampler.collapsed())
+
+        hotspots = []
+        if stats is not None:
+            top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:5]
+            hotspots = [(_label(func), values[2]) for func, values in top]
+
+        result = ProfileResult(self.name, self.mode, stats_path, collapsed_path, hotspots)
+        profile_results.pop(self.name, None)
+        profile_results[self.name] = result
+        return result
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # A builtin, as cProfile reports it.
+    return '%s (%s:%d)' % (name, os.path.basename(filename), line)
@@ -0,0 +1,118 @@
+"""
+redraw.py: Redraw the addon's panels once per tick, only where they are shown.
+
+State changes mark the panels showing them as dirty. The first mark of a
+tick registers a timer that tags the regions of all the dirty panels for
+redraw in one go, in every window. Where those regions are is cached per
+panel place. A flush only checks the windows' screens and the cached areas,
+all the areas are walked again when a screen changes, gains or loses an
+area, a cached area changes type, or a panel is drawn in an area that
+isn't cached.
+"""
+
+import bpy
+from bpy.app.handlers import persistent
+
+from . import timers
+
+
+# Panel -> (space type, region type) it is drawn in.
+PANELS = {
+    'watcher': ('TEXT_EDITOR', 'UI'),
+    'debugger': ('TEXT_EDITOR', 'UI'),
+}
+
+_dirty = set()
+_regions = {}  # (space type, region type) -> [region]
+_areas = {}  # (space type, region type) -> {area pointer: area}
+_layout = None  # What the cached regions were found in.
+
+
+def mark_dirty(*panels):
+    """Have the given panels, or all of them, redrawn on the next tick."""
+    if bpy.app.background:
+        return  # Nothing is drawn.
+    _dirty.update(panels or PANELS)
+    if not timers.is_registered(flush):
+        timers.register(flush, first_interval=0.0)
+
+
+def flush():
+    """Tag the regions of the dirty panels for redraw."""
+    places = set(PANELS[panel] for panel in _dirty if panel in PANELS)
+    _dirty.clear()
+    for place in places:
+        try:
+            for region in find_regions(*place):
+                region.tag_redraw()
+        except ReferenceError:
+            # A region was freed without the layout looking different, look again.
+            clear_cache()
+            for region in find_regions(*place):
+                region.tag_redraw()
+    return None
+
+
+def find_regions(space_type, region_type):
+    """Return the regions of the given type in areas of the given type, in all the windows."""
+    global _layout
+    layout = _screen_layout()
+    if layout != _layout:
+        _regions.clear()
+        _areas.clear()
+        _layout = layout
+
+    place = (space_type, region_type)
+    areas = _areas.get(place)
+    if areas is not None and any(area.type != space_type for area in areas.values()):
+        areas = None
+    if areas is None:
+        areas = {}
+        regions = []
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == space_type:
+                    areas[area.as_pointer()] = area
+                    regions.extend(region for region in area.regions if region.type == region_type)
+        _areas[place] = areas
+        _regions[place] = regions
+    return _regions[place]
+
+
+def drawn(panel, context):
+    """Tell that a panel is drawn, from its draw(), to find areas changed to its space type."""
+    areas = _areas.get(PANELS[panel])
+    if areas is not None and context.area is not None and context.area.as_pointer() not in areas:
+        del _areas[PANELS[panel]]
+
+
+def clear_cache():
+    global _layout
+    _regions.clear()
+    _areas.clear()
+    _layout = None
+
+
+def _screen_layout():
+    """Return what identifies the windows' screens and their number of areas, without walking them."""
+    wm = bpy.context.window_manager
+    if wm is None:
+        return None
+    return tuple((window.screen.as_pointer(), len(window.screen.areas)) for window in wm.windows)
+
+
+@persistent
+def load_post(dummy):
+    clear_cache()
+
+
+def register():
+    bpy.app.handlers.load_post.append(load_post)
+
+
+def unregister():
+    bpy.app.handlers.load_post.remove(load_post)
+    if timers.is_registered(flush):
+        timers.unregister(flush)
+    _dirty.clear()
+    clear_cache()
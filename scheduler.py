@@ -0,0 +1,88 @@
+"""
+scheduler.py: Debounced reload scheduling for the script watcher.
+
+Saving many files at once, or checking out another branch, produces a burst
+of changes. The scheduler gathers them and only lets a reload through once
+no new change arrived for a quiet period, so the whole burst costs one reload.
+"""
+
+import collections
+import time
+
+
+ReloadBurst = collections.namedtuple('ReloadBurst', 'paths events forced first_time last_time')
+
+
+class ReloadScheduler:
+    """Coalesce changes into a single reload per burst."""
+
+    def __init__(self, quiet_period=0.2, max_delay=2.0):
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay  # Don't let a steady stream of changes postpone the reload forever.
+        self._reset()
+
+    def _reset(self):
+        self._paths = collections.OrderedDict()
+        self._events = 0
+        self._forced = False
+        self._first_time = None
+        self._last_time = None
+
+    def add(self, paths, now=None):
+        """Record changes to the given paths."""
+        paths = list(paths)
+        if not paths:
+            return
+
+        now = time.monotonic() if now is None else now
+        for path in paths:
+            self._paths[path] = None
+        self._events += len(paths)
+
+        if self._first_time is None:
+            self._first_time = now
+        self._last_time = now
+
+    def request(self, now=None):
+        """Ask for a reload on the next check, regardless of the quiet period."""
+        self._forced = True
+        if self._first_time is None:
+            self._first_time = time.monotonic() if now is None else now
+
+    def wait_time(self, now=None):
+        """Return the seconds until a reload is due, None if nothing is pending."""
+        if self._forced:
+            return 0.0
+        if not self._events:
+            return None
+
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(self._last_time + self.quiet_period, self._first_time + self.max_delay) - now)
+
+    def due(self, now=None):
+        """Return True if a reload should run now."""
+        if self._forced:
+            return True
+        if not self._events:
+            return False
+
+        now = time.monotonic() if now is None else now
+        return (now - self._last_time >= self.quiet_period or
+                now - self._first_time >= self.max_delay)
+
+    def hold(self, burst):
+        """Keep the paths of a burst that could not be reloaded, for the next reload."""
+        for path in burst.paths:
+            self._paths.setdefault(path, None)
+
+    def take(self):
+        """Return the pending ReloadBurst and start gathering the next one."""
+        burst = ReloadBurst(
+            paths=list(self._paths),
+            events=self._events,
+            forced=self._forced,
+            first_time=self._first_time,
+            last_time=self._last_time,
+        )
+        self._reset()
+        return burst
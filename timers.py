@@ -0,0 +1,99 @@
+"""
+timers.py: bpy.app.timers, also in background mode.
+
+Blender only runs its timers from the event loop of its windows, so when
+it runs in background mode (blender -b) they never fire. There the addon's
+timers are kept here instead, and run() pumps them while the calling script
+blocks. With a UI everything goes straight to bpy.app.timers.
+"""
+
+import sys
+import time
+import traceback
+
+import bpy
+
+
+_timers = {}  # Function -> time.monotonic() it is due, in background mode only.
+_stopping = False
+
+
+def register(function, first_interval=0.0, persistent=False):
+    if not bpy.app.background:
+        bpy.app.timers.register(function, first_interval=first_interval, persistent=persistent)
+    else:
+        _timers[function] = time.monotonic() + first_interval
+
+
+def unregister(function):
+    if not bpy.app.background:
+        bpy.app.timers.unregister(function)
+    elif function in _timers:
+        del _timers[function]
+    else:
+        raise ValueError('Error: function is not registered')
+
+
+def is_registered(function):
+    if not bpy.app.background:
+        return bpy.app.timers.is_registered(function)
+    return function in _timers
+
+
+def pump():
+    """Run the due timers once, return the seconds until the next one is due, None if none is left."""
+    now = time.monotonic()
+    ran = False
+    for function, due in sorted(_timers.items(), key=lambda item: item[1]):
+        if due > now:
+            break
+        if function not in _timers:
+            continue  # Unregistered by a timer that ran before.
+
+        ran = True
+        try:
+            interval = function()
+        except Exception:
+            # Like Blender, a timer that fails doesn't run again.
+            traceback.print_exc()
+            interval = None
+
+        if function not in _timers:
+            continue
+        if interval is None:
+            del _timers[function]
+        else:
+            _timers[function] = time.monotonic() + interval
+
+    if ran:
+        sys.stdout.flush()  # Output is often piped in background mode, don't hold it back.
+    if not _timers:
+        return None
+    return max(0.0, min(_timers.values()) - time.monotonic())
+
+
+def stop():
+    """Make run() return after the timers that are running."""
+    global _stopping
+    _stopping = True
+
+
+def run(duration=None, max_sleep=0.1):
+    """Pump the timers until stop() is called or duration seconds passed.
+
+    Running out of timers doesn't end it, a debugger attaching or a watched
+    file changing registers new ones.
+    """
+    global _stopping
+    _stopping = False
+    end = None if duration is None else time.monotonic() + duration
+    while not _stopping:
+        wait = pump()
+        if wait is None:
+            wait = max_sleep
+        if end is not None:
+            left = end - time.monotonic()
+            if left <= 0:
+                break
+            wait = min(wait, left)
+        time.sleep(min(wait, max_sleep))
@@ -0,0 +1,113 @@
+"""
+tracing.py: Only trace the watched scripts while a debugger is attached.
+
+Once debugpy listens, every line of Python run by Blender's main thread is
+traced, the other addons' and all the draw callbacks included. In scoped
+mode tracing of the main thread is turned off, and only turned on while
+the watched scripts run: while the watcher executes them and while their
+operators run. Breakpoints elsewhere, in the scripts' panels, timers or
+handlers too, are not hit. The debugger's attach configuration limits
+stepping to the watched directories as well, see ports.py.
+"""
+
+import contextlib
+import functools
+import os
+import types
+
+import bpy
+
+
+OPERATOR_METHODS = ('execute', 'invoke', 'modal')
+
+_debugpy = None  # The debugpy module when tracing is scoped, None otherwise.
+_depth = 0  # Nesting of traced() on the main thread.
+
+# Directories of the watched scripts, and what to call when they change.
+roots = []
+on_roots_changed = None
+
+
+def start(debugpy):
+    """Scope the tracing of the main thread, after debugpy started listening."""
+    global _debugpy
+    _debugpy = debugpy
+    untrace()
+    trace_operators(roots)
+
+
+def stop():
+    """Trace everything again."""
+    global _debugpy
+    if _debugpy is not None:
+        _debugpy.trace_this_thread(True)
+    _debugpy = None
+
+
+def scoped():
+    return _debugpy is not None
+
+
+def untrace():
+    """Turn tracing of the main thread off again, debugpy turns it on when a client attaches."""
+    if _debugpy is not None and _depth == 0:
+        _debugpy.trace_this_thread(False)
+
+
+@contextlib.contextmanager
+def traced():
+    """Trace the main thread within the block, when tracing is scoped."""
+    global _depth
+    if _debugpy is None:
+        yield
+        return
+
+    if _depth == 0:
+        _debugpy.trace_this_thread(True)
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        if _depth == 0 and _debugpy is not None:
+            _debugpy.trace_this_thread(False)
+
+
+def _traced_method(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with traced():
+            return method(*args, **kwargs)
+    wrapper.sw_traced = True
+    return wrapper
+
+
+def _in_roots(filename, directories):
+    filename = os.path.abspath(filename)
+    return any(filename.startswith(os.path.join(directory, '')) for directory in directories)
+
+
+def trace_operators(directories):
+    """Have the operators defined by the files in directories traced when they run.
+
+    Run after every reload, a new version of the script defines new classes
+    and hot reload copies unwrapped methods onto the registered ones.
+    """
+    directories = [os.path.abspath(directory) for directory in directories]
+    classes = list(bpy.types.Operator.__subclasses__())
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        for name in OPERATOR_METHODS:
+            method = cls.__dict__.get(name)
+            if not isinstance(method, types.FunctionType) or getattr(method, 'sw_traced', False):
+                continue
+            if _in_roots(method.__code__.co_filename, directories):
+                setattr(cls, name, _traced_method(method))
+
+
+def set_roots(directories):
+    """Tell which directories are watched."""
+    roots[:] = list(dict.fromkeys(directories))
+    if on_roots_changed is not None:
+        on_roots_changed(list(roots))
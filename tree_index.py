@@ -0,0 +1,221 @@
+"""
+tree_index.py: Incremental index of the watched package trees.
+
+The index remembers the listing of every directory it walked. A rescan only
+lists directories again when their modification time changed, which is
+what happens when an entry is added, removed or renamed in them. Entries a
+PathFilter excludes are left out of the listings, so excluded directories
+are never walked.
+"""
+
+import os
+
+
+class TreeDiff:
+    """Files that were added, removed or modified between two scans."""
+
+    def __init__(self, added=(), removed=(), modified=(), rescanned=()):
+        self.added = list(added)
+        self.removed = list(removed)
+        self.modified = list(modified)
+        self.rescanned = list(rescanned)  # Directories that had to be listed again.
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    def __repr__(self):
+        return 'TreeDiff(added=%r, removed=%r, modified=%r)' % (self.added, self.removed, self.modified)
+
+
+class _DirRecord:
+    __slots__ = ('mtime', 'files', 'subdirs', 'is_package')
+
+    def __init__(self, mtime, files, subdirs, is_package):
+        self.mtime = mtime
+        self.files = files
+        self.subdirs = subdirs
+        self.is_package = is_package
+
+
+class TreeIndex:
+    """Index of all the python paths surrounding the given filepaths.
+
+    Like the walk it replaces, only directories with an __init__.py are
+    treated as part of the package. Their direct subdirectories are still
+    tracked so that a directory turning into a package is noticed.
+
+    Every filepath is a target with its own package tree; the trees share
+    the directory listings and stats, so overlapping targets cost nothing.
+    """
+
+    def __init__(self, *filepaths, path_filter=None):
+        self.filepaths = list(filepaths)
+        self.path_filter = path_filter
+
+        self.paths = []  # Package directories of all the targets.
+        self.files = []  # Files in the package directories.
+
+        self._targets = {}  # Filepath -> (paths, files)
+        self._owners = {}  # File or package directory -> filepath of its target.
+        self._dirs = {}  # Directory -> _DirRecord
+        self._stats = {}  # File -> (mtime, size)
+
+        self.refresh()
+
+    def __contains__(self, path):
+        return path in self._stats
+
+    @property
+    def dirs(self):
+        """All the directories the index looks at, packages or not."""
+        return list(self._dirs)
+
+    def paths_for(self, filepath):
+        """Return the package directories of the given target."""
+        return self._targets[filepath][0]
+
+    def files_for(self, filepath):
+        """Return the files of the given target."""
+        return self._targets[filepath][1]
+
+    def target_of(self, path):
+        """Return the target the file belongs to, or None.
+
+        Files that were removed still belong to the target of their directory.
+        """
+        target = self._owners.get(path)
+        if target is None:
+            target = self._owners.get(os.path.dirname(path))
+        return target
+
+    def refresh(self, hints=None):
+        """Rescan the trees and return a TreeDiff against the previous scan.
+
+        Directories are always checked. When hints is given, only the files
+        in it are stat'ed again, the others keep their cached stats unless
+        their directory had to be listed again.
+        """
+        if hints is not None:
+            hints = set(hints)
+
+        old_stats = self._stats
+        dirs = {}
+        stats = {}
+        rescanned = []
+        targets = {}
+        owners = {}
+
+        for filepath in self.filepaths:
+            paths, files = self._walk(filepath, hints, old_stats, dirs, stats, rescanned)
+            targets[filepath] = (paths, files)
+            for path in paths + files:
+                owners.setdefault(path, filepath)
+
+        self._dirs = dirs
+        self._stats = stats
+        self._targets = targets
+        self._owners = owners
+        self.paths = list(dict.fromkeys(path for paths, files in targets.values() for path in paths))
+        self.files = list(dict.fromkeys(path for paths, files in targets.values() for path in files))
+
+        return TreeDiff(
+            added=[path for path in stats if path not in old_stats],
+            removed=[path for path in old_stats if path not in stats],
+            modified=[path for path, stat in stats.items() if path in old_stats and old_stats[path] != stat],
+            rescanned=rescanned,
+        )
+
+    def _walk(self, filepath, hints, old_stats, dirs, stats, rescanned):
+        """Index the tree of one target, return its package directories and files."""
+        paths = []
+        files = []
+
+        stack = [os.path.dirname(filepath)]
+        while stack:
+            dirname = stack.pop()
+
+            # Another target may have walked this directory already.
+            record = dirs.get(dirname)
+            if record is None:
+                try:
+                    mtime = os.stat(dirname).st_mtime_ns
+                except OSError:
+                    continue
+
+                record = self._dirs.get(dirname)
+                if record is None or record.mtime != mtime:
+                    record = self._scan(dirname, mtime, stats)
+                    rescanned.append(dirname)
+                elif record.is_package:
+                    for name in record.files:
+                        path = os.path.join(dirname, name)
+                        if hints is None or path in hints or path not in old_stats:
+                            stat = _stat(path)
+                            if stat is not None:
+                                stats[path] = stat
+                        else:
+                            stats[path] = old_stats[path]
+                dirs[dirname] = record
+
+            if record.is_package:
+                paths.append(dirname)
+                files.extend(path for path in (os.path.join(dirname, name) for name in record.files) if path in stats)
+                # Reversed so directories come out in the same order as a top down walk.
+                stack.extend(os.path.join(dirname, name) for name in reversed(record.subdirs))
+
+        if not paths:
+            # If we just have one (non __init__) file then index just that file.
+            if filepath not in stats:
+                if hints is None or filepath in hints or filepath not in old_stats:
+                    stat = _stat(filepath)
+                    if stat is not None:
+                        stats[filepath] = stat
+                else:
+                    stats[filepath] = old_stats[filepath]
+            files = [filepath]
+
+        return paths, files
+
+    def _scan(self, dirname, mtime, stats):
+        """List a directory, adding the stats of its files when it is a package."""
+        files = []
+        subdirs = []
+        file_stats = {}
+        is_package = False
+        excluded = self.path_filter.excluded if self.path_filter is not None else None
+        try:
+            with os.scandir(dirname) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if excluded is None or not excluded(entry.path, True):
+                                subdirs.append(entry.name)
+                        else:
+                            if entry.name == '__init__.py':
+                                is_package = True
+                            if excluded is not None and excluded(entry.path):
+                                continue
+                            st = entry.stat()
+                            files.append(entry.name)
+                            file_stats[entry.path] = (st.st_mtime_ns, st.st_size)
+                    except OSError:
+                        continue  # Removed while we were listing.
+        except OSError:
+            pass
+
+        files.sort()
+        subdirs.sort()
+        record = _DirRecord(mtime, files, subdirs, is_package)
+        if record.is_package:
+            for name in files:
+                path = os.path.join(dirname, name)
+                stats[path] = file_stats[path]
+        return record
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
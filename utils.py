@@ -16,14 +16,6 @@ def make_annotations(cls):
     return cls
 
 
-def update_ui_panel():
-    for area in bpy.context.window.screen.areas:
-        if area.type == 'TEXT_EDITOR':
-            for region in area.regions:
-                if region.type == 'UI':
-                    region.tag_redraw()
-                    
-                    
 def operator_with_context(op, ctx, **kwargs):
     """Execute an operator with a specific context"""
 
@@ -33,4 +25,18 @@ def operator_with_context(op, ctx, **kwargs):
         context_override = bpy.context.copy()
         context_override.update(ctx)
         with bpy.context.temp_override(context_override):
-            op(**kwargs)
\ No newline at end of file
+            op(**kwargs)
+
+
+def operator_with_context_batch(op, ctx, calls):
+    """Execute an operator once per kwargs in calls, overriding the context only once"""
+
+    if bpy.app.version < (3, 2, 0):
+        for kwargs in calls:
+            op(ctx, **kwargs)
+    else:
+        context_override = bpy.context.copy()
+        context_override.update(ctx)
+        with bpy.context.temp_override(**context_override):
+            for kwargs in calls:
+                op(**kwargs)
@@ -22,6 +22,10 @@ Author: Isaac Weaver <wisaac407@gmail.com>
 import os
 import sys
 import io
+import collections
+import queue
+import tempfile
+import time
 import traceback
 import types
 import subprocess
@@ -30,32 +34,31 @@ import bpy
 import console_python
 from bpy.app.handlers import persistent
 
-from .utils import make_annotations, operator_with_context
+from . import hotreload, timers, tracing
+from .console_output import console_sink
+from .importhook import WatchedPackageFinder
+from .metrics import reload_metrics
+from .notify import TIERS
+from .pathfilter import DEFAULT_EXCLUDE, DEFAULT_INCLUDE, PathFilter
+from .profiler import ExecProfiler, profile_results
+from .redraw import drawn, mark_dirty
+from .utils import make_annotations
+from .worker import Target, WatcherThread
 
 @persistent
 def load_handler(dummy):
     running = bpy.context.scene.sw_settings.running
 
     # First of all, make sure script watcher is off on all the scenes.
+    stop_watcher()
     for scene in bpy.data.scenes:
-        operator_with_context(
-            bpy.ops.wm.sw_watch_end, {'scene': scene}
-        )
+        scene.sw_settings.running = False
 
     # Startup script watcher on the current scene if needed.
     if running and bpy.context.scene.sw_settings.auto_watch_on_startup:
         bpy.ops.wm.sw_watch_start()
 
 
-def add_scrollback(ctx, text, text_type):
-    for line in text:
-        operator_with_context(
-            bpy.ops.console.scrollback_append, ctx,
-            text=line.replace('\t', '    '),
-            type=text_type
-        )
-
-
 def get_console_id(area):
     """Return the console id of the given region."""
     if area.type == 'CONSOLE':  # Only continue if we have a console area.
@@ -69,205 +72,498 @@ def isnum(s):
     return s[1:].isnumeric() and s[0] in '-+1234567890'
 
 
-class SplitIO(io.StringIO):
-    """Feed the input stream into another stream."""
+def get_mod_name(filepath):
+    """Return the module name and the root path of the givin python file path."""
+    dir, mod = os.path.split(filepath)
+
+    # Module is a package.
+    if mod == '__init__.py':
+        mod = os.path.basename(dir)
+        dir = os.path.dirname(dir)
+
+    # Module is a single file.
+    else:
+        mod = os.path.splitext(mod)[0]
+
+    return mod, dir
+
+
+def get_target_paths(settings):
+    """Return the absolute paths of all the scripts to watch, the main script first."""
+    filepaths = [settings.filepath] + [target.filepath for target in settings.targets if target.enabled]
+    filepaths = [bpy.path.abspath(filepath) for filepath in filepaths if filepath]
+    return list(dict.fromkeys(os.path.normpath(filepath) for filepath in filepaths))
+
+
+def get_class_modules(names):
+    """Return the names of the loaded modules defining Blender classes.
+
+    A partial reload can't keep them, register() would be given the same,
+    still registered, classes again.
+    """
+    class_modules = []
+    for name in names:
+        mod = sys.modules.get(name)
+        for value in getattr(mod, '__dict__', {}).values():
+            if (isinstance(value, type) and issubclass(value, bpy.types.bpy_struct)
+                    and value.__module__ == name):
+                class_modules.append(name)
+                break
+    return class_modules
+
+
+def get_log_path(filepath):
+    """Return the log file for the output of the given script."""
+    name = os.path.basename(filepath)
+    if name == '__init__.py':
+        name = os.path.basename(os.path.dirname(filepath))
+    return os.path.join(tempfile.gettempdir(), 'script_watcher', os.path.splitext(name)[0] + '.log')
+
+
+class RotatingLog:
+    """Append text to a log file, rotating it when it grows too large."""
+
+    def __init__(self, filepath, max_bytes=1024 * 1024, backups=3):
+        self.filepath = filepath
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+
+    def write(self, s):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+            self._file = open(self.filepath, 'a', encoding='utf-8', errors='replace')
+
+        if self._file.tell() + len(s) > self.max_bytes:
+            self._rotate()
+        self._file.write(s)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = '%s.%d' % (self.filepath, i)
+            if os.path.exists(src):
+                os.replace(src, '%s.%d' % (self.filepath, i + 1))
+        if self.backups:
+            os.replace(self.filepath, self.filepath + '.1')
+        self._file = open(self.filepath, 'w', encoding='utf-8', errors='replace')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StreamCapture(io.TextIOBase):
+    """Feed the input stream into another stream, keeping only the most recent lines.
+
+    Lines are split as they are written, so the output is never held in one
+    piece, and cut after max_line_length characters. An optional log
+    receives everything that was written.
+    """
     PREFIX = '[Script Watcher]: '
 
+    max_line_length = 10000
+
     _can_prefix = True
 
-    def __init__(self, stream):
-        io.StringIO.__init__(self)
+    def __init__(self, stream, max_lines=1000, log=None):
+        io.TextIOBase.__init__(self)
 
         self.stream = stream
+        self.log = log
+        self.dropped = 0  # Lines that fell out of the buffer.
+
+        self._lines = collections.deque(maxlen=max_lines)
+        self._partial = []  # Pieces of the line being written.
+        self._partial_length = 0
+        self._cut = 0  # Characters of the line being written that were dropped.
+
+    def writable(self):
+        return True
 
     def write(self, s):
+        length = len(s)
+
         # Make sure we prefix our string before we do anything else with it.
         if self._can_prefix:
             s = self.PREFIX + s
         # only add the prefix if the last stream ended with a newline.
         self._can_prefix = s.endswith('\n')
 
-        # Make sure to call the super classes write method.
-        io.StringIO.write(self, s)
-
         # When we are written to, we also write to the secondary stream.
         self.stream.write(s)
+        if self.log is not None:
+            self.log.write(s)
+
+        pieces = s.split('\n')
+        self._extend_line(pieces[0])
+        for piece in pieces[1:]:
+            self._push(self._take_line())
+            self._extend_line(piece)
+        return length
+
+    def _extend_line(self, piece):
+        room = self.max_line_length - self._partial_length
+        if len(piece) > room:
+            self._cut += len(piece) - room
+            piece = piece[:room]
+        if piece:
+            self._partial.append(piece)
+            self._partial_length += len(piece)
+
+    def _take_line(self):
+        line = self._current_line()
+        self._partial = []
+        self._partial_length = 0
+        self._cut = 0
+        return line
+
+    def _current_line(self):
+        line = ''.join(self._partial)
+        if self._cut:
+            line += ' ... %d characters truncated' % self._cut
+        return line
+
+    def _push(self, line):
+        if len(self._lines) == self._lines.maxlen:
+            self.dropped += 1
+        self._lines.append(line)
+
+    def getlines(self):
+        """Return the buffered lines, like splitting the whole output on new lines would."""
+        lines = list(self._lines)
+        lines.append(self._current_line())
+        if self.dropped:
+            lines.insert(0, '... %d lines truncated' % self.dropped)
+        return lines
+
+
+# The running watcher, one for all the scripts.
+_watcher = None
+
+
+class ScriptWatcher:
+    """Reload the watched scripts with the jobs prepared by a WatcherThread.
+
+    The thread does all the file system work, this class only does what has
+    to happen on the main thread, from a timer callback.
+    """
+    interval = 0.05  # Seconds between checks of the job queue.
+
+    def __init__(self, scene, filepaths):
+        settings = scene.sw_settings
+
+        self.scene_name = scene.name
+        self.filepaths = list(filepaths)
+        self.use_py_console = settings.use_py_console and not bpy.app.background  # No consoles without a UI.
+        self.console_max_lines = settings.console_max_lines
+        self.log_output = settings.log_output
+        self.hot_reload = settings.hot_reload
+        self._reloaders = {}  # Module name -> hotreload.ClassReloader
+
+        targets = [Target(filepath, *get_mod_name(filepath)) for filepath in self.filepaths]
+        self._worker = WatcherThread(
+            targets,
+            backend=settings.backend,
+            reload_delay=settings.reload_delay,
+            partial_reload=settings.partial_reload,
+            ignore_formatting=settings.ignore_formatting,
+            path_filter=PathFilter(
+                [os.path.dirname(filepath) for filepath in self.filepaths],
+                settings.include_globs, settings.exclude_globs, settings.use_gitignore
+            ),
+        )
 
+        # Load the packages' submodules from the code the thread compiled.
+        self._finder = WatchedPackageFinder(
+            [(target.mod_name, target.filepath) for target in targets],
+            self._worker, self._worker.code_cache
+        )
 
-# Define the script watching operator.
-class SW_OP_WatchScript(bpy.types.Operator):
-    """Watches the script for changes, reloads the script if any changes occur."""
-    bl_idname = "wm.sw_watch_start"
-    bl_label = "Watch Script"
-
-    _timer = None
-    _running = False
-    _times = None
-    filepath = None
-
-    def get_paths(self):
-        """Find all the python paths surrounding the given filepath."""
-
-        dirname = os.path.dirname(self.filepath)
+        # The burst being profiled, all its scripts are.
+        self._profiled_burst = None
+
+        # Whether the modules imported before watching were handed to the finder.
+        self._adopted = False
+
+        # Keep a single bound method around, timers are unregistered by identity.
+        self._timer = self._tick
+
+    def start(self):
+        global _watcher
+        _watcher = self
+        if self.hot_reload:
+            hotreload.install()
+        self._finder.install()
+        self._worker.start()
+        tracing.set_roots(os.path.dirname(filepath) for filepath in self.filepaths)
+        timers.register(self._timer, first_interval=self.interval)
+
+    def stop(self):
+        global _watcher
+        if _watcher is self:
+            _watcher = None
+        if timers.is_registered(self._timer):
+            timers.unregister(self._timer)
+
+        self._worker.stop()
+        tracing.set_roots([])
+        self._finder.uninstall()
+        hotreload.uninstall()
+        for filepath in self.filepaths:
+            self.remove_cached_mods(filepath)
+
+    def get_paths(self, filepath):
+        """Return all the python paths surrounding the given filepath."""
+        index = self._worker.index
+        if index is None:
+            return [], [filepath]
+        return index.paths_for(filepath), index.files_for(filepath)
+
+    def detection_latency(self):
+        return self._worker.detection_latency()
+
+    def remove_cached_mods(self, filepath, names=None):
+        """Remove the script modules from the system cache, all of them unless names are given."""
+        mod_name, mod_root = get_mod_name(filepath)
+        if names is None or mod_name in names:
+            sys.modules.pop(mod_name, None)
+
+        # The import hook knows every module it loaded from the watched trees.
+        self._finder.forget(names, filepath)
+
+    def _reload_script_module(self, job, record, profiler=None):
+        """Run the script, return (reloaded, ok).
+
+        reloaded is False if the script couldn't be run, ok is also False if it raised.
+        """
+        filepath = job.target.filepath
+        print('Reloading script:', filepath)
+
+        if job.errors:
+            for path, error in job.errors.items():
+                sys.stderr.write('Not reloading, %s does not compile:\n%s' % (path, error))
+            return False, False
+
+        if job.code is None:
+            print('Could not open script file.')
+            return False, False
 
-        paths = []
-        filepaths = []
+        # Get the module name and the root module path.
+        mod_name, mod_root = get_mod_name(filepath)
 
-        for root, dirs, files in os.walk(dirname, topdown=True):
-            if '__init__.py' in files:
-                paths.append(root)
-                for f in files:
-                    filepaths.append(os.path.join(root, f))
+        with record.phase('purge'):
+            if job.modules is None:
+                self.remove_cached_mods(filepath)
+                retained = ()
             else:
-                dirs[:] = [] # No __init__ so we stop walking this dir.
-
-        # If we just have one (non __init__) file then return just that file.
-        return paths, filepaths or [self.filepath]
-
-    def get_mod_name(self):
-        """Return the module name and the root path of the givin python file path."""
-        dir, mod = os.path.split(self.filepath)
-
-        # Module is a package.
-        if mod == '__init__.py':
-            mod = os.path.basename(dir)
-            dir = os.path.dirname(dir)
+                print('Reloading modules:', ', '.join(sorted(job.modules)))
+                self.remove_cached_mods(filepath, job.modules)
+                retained = [name for name in job.package_modules
+                            if name not in job.modules and name != mod_name and name in sys.modules]
 
-        # Module is a single file.
-        else:
-            mod = os.path.splitext(mod)[0]
-
-        return mod, dir
-
-    def remove_cached_mods(self):
-        """Remove all the script modules from the system cache."""
-        paths, files = self.get_paths()
-        for mod_name, mod in list(sys.modules.items()):
-            try:
-                if hasattr(mod, '__file__') and os.path.dirname(mod.__file__) in paths:
-                    del sys.modules[mod_name]
-            except TypeError:
-                pass
-
-    def _reload_script_module(self):
-        print('Reloading script:', self.filepath)
-        self.remove_cached_mods()
         try:
-            f = open(self.filepath)
-            paths, files = self.get_paths()
-
-            # Get the module name and the root module path.
-            mod_name, mod_root = self.get_mod_name()
+            paths, files = self.get_paths(filepath)
 
             # Create the module and setup the basic properties.
             mod = types.ModuleType('__main__')
-            mod.__file__ = self.filepath
+            mod.__file__ = filepath
             mod.__path__ = paths
             mod.__package__ = mod_name
 
             # Add the module to the system module cache.
             sys.modules[mod_name] = mod
 
+            # The submodules we kept won't be imported again, so bind them on the new package.
+            for name in retained:
+                parent, _, child = name.rpartition('.')
+                if parent == mod_name:
+                    setattr(mod, child, sys.modules[name])
+
+            # Only register the classes that changed again.
+            reloader = None
+            if self.hot_reload:
+                reloader = self._reloaders.setdefault(mod_name, hotreload.ClassReloader())
+
             # Fianally, execute the module.
-            exec(compile(f.read(), self.filepath, 'exec'), mod.__dict__)
-        except IOError:
-            print('Could not open script file.')
+            with record.phase('exec'):
+                if reloader is not None:
+                    reloader.begin()
+                if profiler is not None:
+                    profiler.start()
+                try:
+                    # With scoped tracing, the debugger only traces the script and its operators.
+                    with tracing.traced():
+                        exec(job.code, mod.__dict__)
+                finally:
+                    if profiler is not None:
+                        profiler.stop()
+                    if reloader is not None:
+                        reloader.end()
+                    if tracing.scoped():
+                        tracing.trace_operators([os.path.dirname(filepath)])
+            ok = True
         except:
             sys.stderr.write("There was an error when running the script:\n" + traceback.format_exc())
-        else:
-            f.close()
+            ok = False
+
+        # Reloaded subpackages don't know about the submodules we kept either.
+        for name in retained:
+            parent, _, child = name.rpartition('.')
+            if parent != mod_name and parent in sys.modules and name in sys.modules:
+                if not hasattr(sys.modules[parent], child):
+                    setattr(sys.modules[parent], child, sys.modules[name])
 
-    def reload_script(self, context):
-        """Reload this script while printing the output to blenders python console."""
+        # The next partial reload has to reload these too.
+        self._worker.set_class_modules(filepath, get_class_modules(job.package_modules))
+        return True, ok
+
+    def reload_script(self, job, profile_mode=None):
+        """Reload a script while printing the output to blenders python console.
+
+        With a profile_mode ('CPROFILE' or 'SAMPLING') the script's code is profiled.
+        """
+        record = reload_metrics.cycle(job.burst, job.detected, job.events, job.timings)
+
+        profiler = None
+        if profile_mode is not None:
+            profiler = ExecProfiler(profile_mode, os.path.dirname(job.target.filepath), job.target.mod_name)
 
         # Setup stdout and stderr.
-        stdout = SplitIO(sys.stdout)
-        stderr = SplitIO(sys.stderr)
+        log = RotatingLog(get_log_path(job.target.filepath)) if self.log_output else None
+        stdout = StreamCapture(sys.stdout, self.console_max_lines, log)
+        stderr = StreamCapture(sys.stderr, self.console_max_lines, log)
 
         sys.stdout = stdout
         sys.stderr = stderr
 
         # Run the script.
-        self._reload_script_module()
-
-        # Go back to the begining so we can read the streams.
-        stdout.seek(0)
-        stderr.seek(0)
+        try:
+            reloaded, ok = self._reload_script_module(job, record, profiler)
+
+            if profiler is not None and profiler.ran:
+                try:
+                    result = profiler.save()
+                except OSError as e:
+                    sys.stderr.write('Unable to save the profile: %s\n' % e)
+                else:
+                    print('Profile written to', result.stats_path or result.collapsed_path)
+        finally:
+            if log is not None:
+                log.close()
+
+        record.ready = time.monotonic()
+        record.ok = record.ok and ok
+        record.targets.append(job.target.mod_name)
+        bl_info = getattr(sys.modules.get(job.target.mod_name), 'bl_info', None)
+        if reloaded and isinstance(bl_info, dict) and 'version' in bl_info:
+            record.versions[job.target.mod_name] = list(bl_info['version'])
+
+        with record.phase('output'):
+            output = stdout.getlines()
+            output_err = stderr.getlines()
+
+            if self.use_py_console:
+                # Queue the output for the consoles, it is written over the next timer ticks.
+                # The captures already kept the most recent lines, leave room for their markers.
+                console_sink.begin(self.console_max_lines + 2)
+                console_sink.write(output, 'OUTPUT')
+                console_sink.write(output_err, 'ERROR')
+                console_sink.end(lambda seconds: record.add('output', seconds))
 
-        # Don't use readlines because that leaves trailing new lines.
-        output = stdout.read().split('\n')
-        output_err = stderr.read().split('\n')
+        # Cleanup
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        return reloaded
 
-        if self.use_py_console:
-            # Print the output to the consoles.
-            for area in context.screen.areas:
-                if area.type == "CONSOLE":
-                    ctx = {"area": area}
+    def _tick(self):
+        scene = bpy.data.scenes.get(self.scene_name)
+        if scene is None or not scene.sw_settings.running:
+            self.stop()
+            return None
 
-                    # Actually print the output.
-                    if output:
-                        add_scrollback(ctx, output, 'OUTPUT')
+        settings = scene.sw_settings
+        if settings.reload:
+            settings.reload = False
+            self._worker.request_reload()
 
-                    if output_err:
-                        add_scrollback(ctx, output_err, 'ERROR')
+        if settings.skipped_reloads != self._worker.skipped_reloads:
+            settings.skipped_reloads = self._worker.skipped_reloads
+            mark_dirty('watcher')
 
-        # Cleanup
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
+        # The jobs of a burst come in dependency order, run them in that order.
+        while True:
+            try:
+                job = self._worker.jobs.get_nowait()
+            except queue.Empty:
+                break
+            settings.merged_changes = job.events
+            mark_dirty('watcher')
+
+            if not self._adopted:
+                # The thread has indexed the trees once it sends jobs.
+                self._finder.adopt()
+                self._adopted = True
+
+            if settings.profile_next_reload and not job.errors:
+                settings.profile_next_reload = False
+                self._profiled_burst = job.burst
+
+            if job.burst == self._profiled_burst:
+                self.reload_script(job, settings.profile_mode)
+            else:
+                self.reload_script(job)
 
-    def modal(self, context, event):
-        if not context.scene.sw_settings.running:
-            self.cancel(context)
-            return {'CANCELLED'}
+        return self.interval
 
-        if context.scene.sw_settings.reload:
-            context.scene.sw_settings.reload = False
-            self.reload_script(context)
-            return {'PASS_THROUGH'}
 
-        if event.type == 'TIMER':
-            for path in self._times:
-                cur_time = os.stat(path).st_mtime
+def stop_watcher():
+    """Stop the running watcher, if any."""
+    if _watcher is not None:
+        _watcher.stop()
 
-                if cur_time != self._times[path]:
-                    self._times[path] = cur_time
-                    self.reload_script(context)
 
-        return {'PASS_THROUGH'}
+# Define the script watching operator.
+class SW_OP_WatchScript(bpy.types.Operator):
+    """Watches the script for changes, reloads the script if any changes occur."""
+    bl_idname = "wm.sw_watch_start"
+    bl_label = "Watch Script"
 
     def execute(self, context):
-        if context.scene.sw_settings.running:
+        settings = context.scene.sw_settings
+        if settings.running:
+            return {'CANCELLED'}
+
+        # A single watcher serves all the scripts.
+        if _watcher is not None:
+            self.report({'ERROR'}, 'Already watching scripts in scene %s.' % _watcher.scene_name)
             return {'CANCELLED'}
 
-        # Grab the settings and store them as local variables.
-        self.filepath = bpy.path.abspath(context.scene.sw_settings.filepath)
-        self.use_py_console = context.scene.sw_settings.use_py_console
+        filepaths = get_target_paths(settings)
 
         # If it's not a file, doesn't exist or permistion is denied we don't preceed.
-        if not os.path.isfile(self.filepath):
+        for filepath in filepaths:
+            if not os.path.isfile(filepath):
+                self.report({'ERROR'}, 'Unable to open script %s.' % filepath)
+                return {'CANCELLED'}
+        if not filepaths:
             self.report({'ERROR'}, 'Unable to open script.')
             return {'CANCELLED'}
 
-        # Setup the times dict to keep track of when all the files where last edited.
-        dirs, files = self.get_paths()
-        self._times = dict((path, os.stat(path).st_mtime) for path in files) # Where we store the times of all the paths.
-        self._times[files[0]] = 0  # We set one of the times to 0 so the script will be loaded on startup.
+        # Scripts are loaded by module name, two scripts can't share one.
+        names = [get_mod_name(filepath)[0] for filepath in filepaths]
+        for name in names:
+            if names.count(name) > 1:
+                self.report({'ERROR'}, 'More than one watched script is named %s.' % name)
+                return {'CANCELLED'}
 
-        # Setup the event timer.
-        wm = context.window_manager
-        self._timer = wm.event_timer_add(0.1, window=context.window)
-        wm.modal_handler_add(self)
-
-        context.scene.sw_settings.running = True
-        return {'RUNNING_MODAL'}
+        ScriptWatcher(context.scene, filepaths).start()
 
-    def cancel(self, context):
-        wm = context.window_manager
-        wm.event_timer_remove(self._timer)
-
-        self.remove_cached_mods()
-
-        context.scene.sw_settings.running = False
+        settings.merged_changes = 0
+        settings.skipped_reloads = 0
+        settings.running = True
+        return {'FINISHED'}
 
 
 class SW_OP_StopScriptWatcher(bpy.types.Operator):
@@ -276,7 +572,7 @@ class SW_OP_StopScriptWatcher(bpy.types.Operator):
     bl_label = "Stop Watching"
 
     def execute(self, context):
-        # Setting the running flag to false will cause the modal to cancel itself.
+        # Setting the running flag to false will cause the watcher to stop itself.
         context.scene.sw_settings.running = False
         return {'FINISHED'}
 
@@ -287,11 +583,69 @@ class SW_OP_ReloadScriptWatcher(bpy.types.Operator):
     bl_label = "Reload Script"
 
     def execute(self, context):
-        # Setting the reload flag to true will cause the modal to cancel itself.
+        # Setting the reload flag to true will cause the watcher to reload the script.
         context.scene.sw_settings.reload = True
         return {'FINISHED'}
 
 
+class SW_OP_AddTarget(bpy.types.Operator):
+    """Watch another script along with the main one."""
+    bl_idname = "wm.sw_target_add"
+    bl_label = "Add Script"
+
+    def execute(self, context):
+        settings = context.scene.sw_settings
+        settings.targets.add()
+        settings.active_target = len(settings.targets) - 1
+        return {'FINISHED'}
+
+
+class SW_OP_RemoveTarget(bpy.types.Operator):
+    """Stop watching the selected script."""
+    bl_idname = "wm.sw_target_remove"
+    bl_label = "Remove Script"
+
+    @classmethod
+    def poll(cls, context):
+        settings = context.scene.sw_settings
+        return 0 <= settings.active_target < len(settings.targets)
+
+    def execute(self, context):
+        settings = context.scene.sw_settings
+        settings.targets.remove(settings.active_target)
+        settings.active_target = min(settings.active_target, len(settings.targets) - 1)
+        return {'FINISHED'}
+
+
+@make_annotations
+class SW_OP_ExportMetrics(bpy.types.Operator):
+    """Append the timings of the recent reloads to a JSON lines file."""
+    bl_idname = "wm.sw_export_metrics"
+    bl_label = "Export Timings"
+
+    filepath = bpy.props.StringProperty(subtype='FILE_PATH')
+
+    @classmethod
+    def poll(cls, context):
+        return bool(reload_metrics.records)
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = 'script_watcher_timings.jsonl'
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        try:
+            count = reload_metrics.export(bpy.path.abspath(self.filepath))
+        except OSError as e:
+            self.report({'ERROR'}, 'Unable to write timings: %s' % e)
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, 'Exported the timings of %d reloads.' % count)
+        return {'FINISHED'}
+
+
 class SW_OP_OpenExternalEditor(bpy.types.Operator):
     """Edit script in an external text editor."""
     bl_idname = "wm.sw_edit_externally"
@@ -309,6 +663,15 @@ class SW_OP_OpenExternalEditor(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class SW_UL_Targets(bpy.types.UIList):
+    """The other scripts to watch."""
+
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, 'enabled', text='')
+        row.prop(item, 'filepath', text='', emboss=False)
+
+
 # Create the UI for the operator. NEEDS FINISHING!!
 class SW_PT_ScriptWatcherPanel(bpy.types.Panel):
     """UI for the script watcher."""
@@ -319,13 +682,36 @@ class SW_PT_ScriptWatcherPanel(bpy.types.Panel):
     bl_category = "Code Tools"
 
     def draw(self, context):
+        drawn('watcher', context)
         layout = self.layout
         running = context.scene.sw_settings.running
 
         col = layout.column()
         col.prop(context.scene.sw_settings, 'filepath')
+
+        col.label(text='Also watch:')
+        row = col.row()
+        row.template_list('SW_UL_Targets', '', context.scene.sw_settings, 'targets',
+                          context.scene.sw_settings, 'active_target', rows=3)
+        sub = row.column(align=True)
+        sub.operator('wm.sw_target_add', icon='ADD' if bpy.app.version >= (2, 80, 0) else 'ZOOMIN', text='')
+        sub.operator('wm.sw_target_remove', icon='REMOVE' if bpy.app.version >= (2, 80, 0) else 'ZOOMOUT', text='')
+
         col.prop(context.scene.sw_settings, 'use_py_console')
+        if context.scene.sw_settings.use_py_console:
+            col.prop(context.scene.sw_settings, 'console_max_lines')
+        col.prop(context.scene.sw_settings, 'log_output')
+        if context.scene.sw_settings.log_output:
+            col.label(text=get_log_path(bpy.path.abspath(context.scene.sw_settings.filepath)), icon='FILE_TEXT')
         col.prop(context.scene.sw_settings, 'auto_watch_on_startup')
+        col.prop(context.scene.sw_settings, 'backend')
+        col.prop(context.scene.sw_settings, 'reload_delay')
+        col.prop(context.scene.sw_settings, 'partial_reload')
+        col.prop(context.scene.sw_settings, 'ignore_formatting')
+        col.prop(context.scene.sw_settings, 'include_globs')
+        col.prop(context.scene.sw_settings, 'exclude_globs')
+        col.prop(context.scene.sw_settings, 'use_gitignore')
+        col.prop(context.scene.sw_settings, 'hot_reload')
 
         if bpy.app.version < (2, 80, 0):
             col.operator('wm.sw_watch_start', icon='VISIBLE_IPO_ON')
@@ -339,10 +725,61 @@ class SW_PT_ScriptWatcherPanel(bpy.types.Panel):
             row.operator('wm.sw_watch_end', icon='CANCEL')
             row.operator('wm.sw_reload', icon='FILE_REFRESH')
 
+            row = layout.row(align=True)
+            row.prop(context.scene.sw_settings, 'profile_next_reload')
+            row.prop(context.scene.sw_settings, 'profile_mode', text='')
+
+            merged = context.scene.sw_settings.merged_changes
+            if merged > 1:
+                layout.label(text='Last reload merged %d changes' % merged, icon='INFO')
+
+            skipped = context.scene.sw_settings.skipped_reloads
+            if skipped:
+                layout.label(text='Skipped %d reloads, content unchanged' % skipped, icon='INFO')
+
+        for result in profile_results.values():
+            box = layout.box()
+            box.label(text='Profile of %s' % result.name, icon='SORTTIME')
+            for label, seconds in result.hotspots:
+                box.label(text='%.1f ms  %s' % (seconds * 1000, label))
+
+        layout.prop(context.scene.sw_settings, 'show_timings')
+        if context.scene.sw_settings.show_timings:
+            box = layout.box()
+            percentiles = reload_metrics.percentiles()
+            if percentiles:
+                box.label(text='Latency p50 %.1f ms, p90 %.1f ms, p99 %.1f ms' % (
+                    percentiles[50] * 1000, percentiles[90] * 1000, percentiles[99] * 1000), icon='TIME')
+            latency = _watcher.detection_latency() if _watcher is not None else {}
+            for tier in TIERS:
+                if tier in latency:
+                    median, longest, count = latency[tier]
+                    box.label(text='Detection of %s files: median %.0f ms, max %.0f ms (%d)' % (
+                        tier.lower(), median * 1000, longest * 1000, count))
+            for record in reload_metrics.recent():
+                box.label(text=record.summary())
+            box.operator('wm.sw_export_metrics', icon='EXPORT')
+
         layout.separator()
         layout.operator('wm.sw_edit_externally', icon='TEXT')
 
 
+@make_annotations
+class ScriptWatcherTarget(bpy.types.PropertyGroup):
+    """Another script watched along with the main one."""
+    filepath = bpy.props.StringProperty(
+        name='Script',
+        description='Script file to watch for changes.',
+        subtype='FILE_PATH'
+    )
+
+    enabled = bpy.props.BoolProperty(
+        name='Enabled',
+        description='Watch this script',
+        default=True
+    )
+
+
 @make_annotations
 class ScriptWatcherSettings(bpy.types.PropertyGroup):
     """All the script watcher settings."""
@@ -355,28 +792,131 @@ class ScriptWatcherSettings(bpy.types.PropertyGroup):
         subtype='FILE_PATH'
     )
 
+    targets = bpy.props.CollectionProperty(type=ScriptWatcherTarget)
+    active_target = bpy.props.IntProperty(default=0)
+
     use_py_console = bpy.props.BoolProperty(
         name='Use py console',
         description='Use blenders built-in python console for program output (e.g. print statements and error messages)',
         default=False
     )
 
+    console_max_lines = bpy.props.IntProperty(
+        name='Console lines',
+        description='Number of most recent output and error lines kept for the console per reload',
+        default=1000,
+        min=10
+    )
+
+    log_output = bpy.props.BoolProperty(
+        name='Log to file',
+        description='Also write the full output of every reload to a rotating log file in the temporary directory',
+        default=False
+    )
+
     auto_watch_on_startup = bpy.props.BoolProperty(
         name='Watch on startup',
         description='Watch script automatically on new .blend load',
         default=False
     )
 
+    backend = bpy.props.EnumProperty(
+        name='Detection',
+        description='How changes to the watched files are detected',
+        items=(
+            ('AUTO', 'Automatic', 'Use file system events when available, polling otherwise'),
+            ('INOTIFY', 'Inotify', 'Use linux file system events'),
+            ('POLLING', 'Polling', 'Check modification times, the most recently edited files most often'),
+        ),
+        default='AUTO'
+    )
+
+    reload_delay = bpy.props.FloatProperty(
+        name='Reload Delay',
+        description='Seconds without new changes to wait before reloading, so saving many files only reloads once',
+        default=0.2,
+        min=0.0,
+        max=5.0,
+        subtype='TIME',
+        unit='TIME'
+    )
+
+    partial_reload = bpy.props.BoolProperty(
+        name='Partial reload',
+        description='Only reload the changed modules and the modules importing them, instead of the whole package',
+        default=True
+    )
+
+    ignore_formatting = bpy.props.BoolProperty(
+        name='Ignore formatting',
+        description='Don\'t reload when only comments or whitespace changed',
+        default=False
+    )
+
+    include_globs = bpy.props.StringProperty(
+        name='Include',
+        description='Comma separated globs of the files to watch, relative to the script\'s directory when they have a slash',
+        default=DEFAULT_INCLUDE
+    )
+
+    exclude_globs = bpy.props.StringProperty(
+        name='Exclude',
+        description='Comma separated globs of the files and directories not to watch, a trailing slash only matches directories',
+        default=DEFAULT_EXCLUDE
+    )
+
+    use_gitignore = bpy.props.BoolProperty(
+        name='Use .gitignore',
+        description='Don\'t watch the files the .gitignore files of the script\'s repository ignore',
+        default=True
+    )
+
+    hot_reload = bpy.props.BoolProperty(
+        name='Hot reload classes',
+        description='Only register the Blender classes that changed again, the others get the new method implementations in place',
+        default=False
+    )
+
+    profile_next_reload = bpy.props.BoolProperty(
+        name='Profile next reload',
+        description='Profile the code run by the next reload, the results are saved in a .sw_profiles directory next to the script',
+        default=False
+    )
+
+    profile_mode = bpy.props.EnumProperty(
+        name='Profiler',
+        description='How the next reload is profiled',
+        items=(
+            ('CPROFILE', 'cProfile', 'Record every function call, exact but slows the script down'),
+            ('SAMPLING', 'Sampling', 'Look at the running code every millisecond from a side thread, barely slows the script down'),
+        ),
+        default='CPROFILE'
+    )
+
+    show_timings = bpy.props.BoolProperty(
+        name='Reload timings',
+        description='Show how long the recent reloads took, from the first change until the scripts were run',
+        default=False
+    )
+
+    merged_changes = bpy.props.IntProperty(default=0)
+    skipped_reloads = bpy.props.IntProperty(default=0)
+
 
 
 classes = (
     SW_OP_WatchScript,
     SW_OP_StopScriptWatcher,
     SW_OP_ReloadScriptWatcher,
+    SW_OP_AddTarget,
+    SW_OP_RemoveTarget,
+    SW_OP_ExportMetrics,
     SW_OP_OpenExternalEditor,
 
+    ScriptWatcherTarget,
     ScriptWatcherSettings,
 
+    SW_UL_Targets,
     SW_PT_ScriptWatcherPanel,
 )
 
@@ -397,5 +937,7 @@ def unregister_watcher():
         unregister_class(cls)
 
     bpy.app.handlers.load_post.remove(load_handler)
+    stop_watcher()
+    console_sink.clear()
 
     del bpy.types.Scene.sw_settings
\ No newline at end of file
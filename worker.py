@@ -0,0 +1,330 @@
+"""
+worker.py: Background thread doing the file system work of the script watcher.
+
+The thread owns the tree index, the change backend, the change filter, the
+reload scheduler, the import graph and the precompiler, shared by all the
+watched scripts. Whenever a burst of changes is ready it puts ReloadJobs on
+a queue; the main thread only has to take the jobs and run the code.
+"""
+
+import collections
+import itertools
+import os
+import queue
+import threading
+import time
+import traceback
+
+from .bytecode import CodeCache, Precompiler, write_pycache
+from .change_filter import ChangeFilter
+from .depgraph import ImportGraph, module_name
+from .notify import create_backend, RESCAN
+from .scheduler import ReloadScheduler
+from .tree_index import TreeIndex
+
+
+# A watched script: its file, the name it is loaded as and the directory that name is relative to.
+Target = collections.namedtuple('Target', 'filepath mod_name mod_root')
+
+ReloadJob = collections.namedtuple('ReloadJob', 'target events modules package_modules code errors detected burst timings')
+
+# Numbers the bursts, the jobs of one burst make up one reload cycle.
+_bursts = itertools.count(1)
+
+
+class WatcherThread(threading.Thread):
+    """Watch the scripts' packages and prepare reload jobs for the main thread.
+
+    All the targets share the index, the backend and the scheduler, a burst
+    of changes becomes one job per target to reload, queued in dependency
+    order: a target comes after the targets it imports.
+    """
+
+    def __init__(self, targets, backend='AUTO', reload_delay=0.2,
+                 partial_reload=True, ignore_formatting=False, path_filter=None):
+        threading.Thread.__init__(self, name='ScriptWatcher', daemon=True)
+
+        self.targets = list(targets)
+        self.backend_kind = backend
+        self.partial_reload = partial_reload
+        self.path_filter = path_filter
+
+        self.jobs = queue.Queue()  # ReloadJobs for the main thread.
+        self.skipped_reloads = 0
+
+        self.index = None
+        self.code_cache = CodeCache()
+        self._scheduler = ReloadScheduler(reload_delay)
+        self._filter = ChangeFilter(ignore_formatting)
+        self._graph = ImportGraph()
+        self._backend = None
+        self._precompiler = None
+
+        # Time spent walking the tree and compiling since the last burst was taken.
+        self._walk_time = 0.0
+        self._pool_time = 0.0
+        self._compile_mark = 0.0  # The precompiler's busy time when the last burst was taken.
+
+        # Target filepath -> its modules defining Blender classes, told by the main thread.
+        self._class_modules = {}
+
+        self._by_filepath = dict((target.filepath, target) for target in self.targets)
+        self._by_name = dict((target.mod_name, target) for target in self.targets)
+
+        self._wake = threading.Event()
+        self._reload_requested = threading.Event()
+        self._stopping = False
+
+    def __contains__(self, path):
+        """Return True if path is one of the watched files."""
+        return self.index is not None and path in self.index
+
+    @property
+    def paths(self):
+        """The package directories of the watched scripts."""
+        return [] if self.index is None else self.index.paths
+
+    def target_of(self, path):
+        """Return the filepath of the target a watched file belongs to, or None."""
+        return None if self.index is None else self.index.target_of(path)
+
+    def detection_latency(self):
+        """Return {tier: (median, max, count)} of the seconds the backend took to see changes."""
+        return {} if self._backend is None else self._backend.latency()
+
+    def request_reload(self):
+        """Ask for a full reload, safe to call from any thread."""
+        self._reload_requested.set()
+        self._wake.set()
+
+    def set_class_modules(self, filepath, names):
+        """Tell which modules of a target define Blender classes, safe to call from any thread."""
+        self._class_modules[filepath] = frozenset(names)
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        self.join(2.0)
+
+    def run(self):
+        # Index the packages and watch every file and directory in them.
+        start = time.perf_counter()
+        self.index = TreeIndex(*[target.filepath for target in self.targets], path_filter=self.path_filter)
+        self._walk_time += time.perf_counter() - start
+        self._backend = create_backend(self.backend_kind)
+        self._backend.wakeup = self._wake
+        self._backend.watch(self.index.files, self.index.dirs)
+        self._filter.prime(self.index.files)
+
+        # Compile the whole packages up front, the first reload only has to run them.
+        # The process pool writes the .pyc files, the precompiler then only loads them.
+        start = time.perf_counter()
+        write_pycache(self.index.files)
+        self._pool_time += time.perf_counter() - start
+
+        # Keep room for every file, the least recently used would be evicted by the others.
+        self.code_cache.maxsize = max(self.code_cache.maxsize, len(self.index.files))
+        self._precompiler = Precompiler(self.code_cache)
+        self._precompiler.submit(self.index.files)
+
+        # Load the scripts on startup.
+        self._scheduler.request()
+
+        try:
+            while not self._stopping:
+                self._wake.wait(self._timeout())
+                self._wake.clear()
+                if self._stopping:
+                    break
+
+                if self._reload_requested.is_set():
+                    self._reload_requested.clear()
+                    self._scheduler.request()
+
+                changes = self._backend.drain()
+                if changes:
+                    self._add_changes(changes)
+
+                # Prepare a single reload for all the changes gathered since the last one.
+                if self._scheduler.due():
+                    self._make_jobs(self._scheduler.take())
+        finally:
+            self._backend.close()
+            self._precompiler.close()
+
+    def _timeout(self):
+        """Return how long the thread may sleep, None to wait for the next event."""
+        timeout = self._scheduler.wait_time()
+        delay = self._backend.poll_delay()
+        if delay is not None:
+            timeout = delay if timeout is None else min(timeout, delay)
+        return timeout
+
+    def _add_changes(self, changes):
+        if any(change.kind == RESCAN for change in changes):
+            hints = None
+        else:
+            hints = [change.path for change in changes]
+
+        start = time.perf_counter()
+        diff = self.index.refresh(hints)
+        self._walk_time += time.perf_counter() - start
+
+        # Files or directories came or went, keep the backend in sync with the index.
+        if diff.added or diff.removed or diff.rescanned:
+            self._backend.watch(self.index.files, self.index.dirs)
+            self.code_cache.maxsize = max(self.code_cache.maxsize, len(self.index.files))
+
+        paths = self._filter.filter(diff)
+        if diff and not paths:
+            # Only timestamps changed, there is nothing to reload.
+            self.skipped_reloads += 1
+
+        # Start compiling right away, the reload will only have to run the code.
+        self._precompiler.submit(paths)
+        self._scheduler.add(paths)
+
+    def _make_jobs(self, burst):
+        # Syntax errors are reported from the background compile, before anything is torn down.
+        self._precompiler.wait()
+        self._update_graph()
+        start = time.perf_counter()
+
+        burst_id = next(_bursts)
+        timings = {'walk': self._walk_time}
+        self._walk_time = 0.0
+
+        plan = self._plan(burst)
+        errors = self._precompiler.errors(burst.paths + [target.filepath for target, modules in plan])
+
+        jobs = []
+        for target, modules in plan:
+            target_errors = dict((path, error) for path, error in errors.items()
+                                 if self.index.target_of(path) == target.filepath)
+
+            code = None
+            if not errors:
+                try:
+                    code = self.code_cache.get(target.filepath)
+                except SyntaxError as e:
+                    target_errors = {target.filepath: ''.join(traceback.format_exception_only(type(e), e))}
+                except OSError:
+                    pass  # Reported by the main thread.
+            errors.update(target_errors)
+
+            jobs.append(ReloadJob(
+                target=target,
+                events=burst.events,
+                modules=modules,
+                package_modules=self._target_modules(target),
+                code=code,
+                errors=target_errors,
+                detected=burst.first_time,
+                burst=burst_id,
+                timings=timings,
+            ))
+
+        # The compile time of the burst is what the pool and the precompiler did for it, plus getting the scripts' code.
+        busy_time = self._precompiler.busy_time
+        timings['compile'] = self._pool_time + busy_time - self._compile_mark + time.perf_counter() - start
+        self._compile_mark = busy_time
+        self._pool_time = 0.0
+
+        if errors:
+            # Nothing is reloaded while a target doesn't compile, the targets importing it
+            # would pick up the old modules. Keep the changes for the next reload.
+            self._scheduler.hold(burst)
+            jobs = [job for job in jobs if job.errors]
+
+        for job in jobs:
+            self.jobs.put(job)
+
+    def _update_graph(self):
+        modules = {}
+        for target in self.targets:
+            for path in self.index.files_for(target.filepath):
+                name = module_name(path, target.mod_root)
+                if name is not None and name.partition('.')[0] == target.mod_name:
+                    modules.setdefault(name, path)
+        self._graph.update(modules)
+
+    def _target_modules(self, target):
+        prefix = target.mod_name + '.'
+        return [name for name in self._graph.modules if name == target.mod_name or name.startswith(prefix)]
+
+    def _plan(self, burst):
+        """Return (target, modules) for every target to reload, in dependency order.
+
+        modules is None when the whole target has to be reloaded.
+        """
+        if burst.forced:
+            return [(target, None) for target in self._ordered(self.targets)]
+
+        full = set()  # Filepaths of the targets to reload completely.
+        changed = set()
+        for path in burst.paths:
+            filepath = self.index.target_of(path)
+            if filepath is None:
+                # Not part of any target anymore, play it safe.
+                return [(target, None) for target in self._ordered(self.targets)]
+
+            name = self._graph.module_for(path)
+            # Only packages get their submodules imported under a name we can predict.
+            if (name is None or not self.partial_reload
+                    or os.path.basename(filepath) != '__init__.py'):
+                full.add(filepath)  # Not a module we know (data file, removed module...).
+            else:
+                changed.add(name)
+
+        for filepath in full:
+            changed.update(self._target_modules(self._by_filepath[filepath]))
+
+        # Kept modules would have their classes registered twice, reload them with the rest of their target.
+        for filepath, names in list(self._class_modules.items()):
+            target = self._by_filepath.get(filepath)
+            if target is not None and any(name.partition('.')[0] == target.mod_name for name in changed):
+                changed.update(names)
+
+        # Targets importing the changed modules have to be reloaded too.
+        affected = {}
+        for name in self._graph.dependents(changed):
+            target = self._by_name.get(name.partition('.')[0])
+            if target is not None:
+                affected.setdefault(target.filepath, set()).add(name)
+        for filepath in full:
+            affected[filepath] = None
+
+        plan = []
+        for target in self._ordered([target for target in self.targets if target.filepath in affected]):
+            modules = affected[target.filepath]
+            if not self.partial_reload or os.path.basename(target.filepath) != '__init__.py':
+                modules = None
+            plan.append((target, modules))
+        return plan
+
+    def _ordered(self, targets):
+        """Sort targets so that every target comes after the targets it imports.
+
+        Targets that don't depend on each other keep their order, so do targets
+        importing each other.
+        """
+        depends = dict((target.filepath, set()) for target in targets)
+        for target in targets:
+            for name in self._target_modules(target):
+                for importer in self._graph.importers(name):
+                    other = self._by_name.get(importer.partition('.')[0])
+                    if other is not None and other is not target and other.filepath in depends:
+                        depends[other.filepath].add(target.filepath)
+
+        ordered = []
+        pending = list(targets)
+        while pending:
+            ready = [target for target in pending if not depends[target.filepath]]
+            if not ready:
+                ready = pending[:1]  # An import cycle, fall back to the given order.
+            for target in ready:
+                pending.remove(target)
+                ordered.append(target)
+                for deps in depends.values():
+                    deps.discard(target.filepath)
+        return ordered